@@ -16,6 +16,7 @@ LICENSE      = 'MIT'
 KEYWORDS     = 'Astronomy Python CitizenScience LightPollution'
 URL          = 'https://github.com/actionprojecteu/tools-actionproject/'
 DEPENDENCIES = ["panoptes-client"]
+EXTRAS       = {"aio": ["aiohttp"], "aggregate": ["pandas"]}
 
 CLASSIFIERS  = [
     'Environment :: Console',
@@ -31,7 +32,7 @@ CLASSIFIERS  = [
 
 PACKAGE_DATA = {}
 
-SCRIPTS = [ "scripts/mongotool", "scripts/epi5spectra", "scripts/zoonispectra"]
+SCRIPTS = [ "scripts/mongotool", "scripts/epi5spectra", "scripts/zoonispectra", "scripts/actiontool", "scripts/actiond"]
 
 DATA_FILES = []
 
@@ -51,6 +52,7 @@ setup(
     packages         = find_packages("src"),
     package_dir      = {"": "src"},
     install_requires = DEPENDENCIES,
+    extras_require   = EXTRAS,
     scripts          = SCRIPTS,
     package_data     = PACKAGE_DATA,
     data_files       = DATA_FILES,
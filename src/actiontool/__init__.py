@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+#--------------------
+# System wide imports
+# -------------------
+
+# ---------------
+# Airflow imports
+# ---------------
+
+#--------------
+# local imports
+# -------------
+
+from tools_actionproject.cli import lazy_version
+
+
+# -----------------------
+# Module global variables
+# -----------------------
+
+# ----------------
+# Module constants
+# ----------------
+
+DEFAULT_QUEUE = 1000 # Records buffered between pipeline stages
+STORE_KINDS   = ('observations', 'entries', 'classifications')
+
+
+__getattr__ = lazy_version(__name__)
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+#--------------------
+# System wide imports
+# -------------------
+
+import sys
+import argparse
+import os.path
+import logging
+#import logging.handlers
+import traceback
+import importlib
+
+# -------------
+# Local imports
+# -------------
+
+from tools_actionproject.cli import version, VersionAction, add_http_options, apply_http_options
+from mongotool import DEFAULT_TPS
+from . import DEFAULT_QUEUE, STORE_KINDS
+
+
+# -----------------------
+# Module global variables
+# -----------------------
+
+log = logging.getLogger("actiontool")
+
+# -----------------------
+# Module global functions
+# -----------------------
+
+def configureLogging(options):
+	if options.verbose:
+		level = logging.DEBUG
+	elif options.quiet:
+		level = logging.WARN
+	else:
+		level = logging.INFO
+	
+	log.setLevel(level)
+	# Log formatter
+	#fmt = logging.Formatter('%(asctime)s - %(name)s [%(levelname)s] %(message)s')
+	fmt = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
+	# create console handler and set level to debug
+	if not options.no_console:
+		ch = logging.StreamHandler()
+		ch.setFormatter(fmt)
+		ch.setLevel(level)
+		log.addHandler(ch)
+	# Create a file handler
+	if options.log_file:
+		#fh = logging.handlers.WatchedFileHandler(options.log_file)
+		fh = logging.FileHandler(options.log_file)
+		fh.setFormatter(fmt)
+		fh.setLevel(level)
+		log.addHandler(fh)
+
+
+def python2_warning():
+	if sys.version_info[0] < 3:
+		log.warning("This software des not run under Python 2 !")
+
+
+def setup(options):
+	python2_warning()
+	apply_http_options(options)
+	
+
+# =================== #
+# THE ARGUMENT PARSER #
+# =================== #
+
+def createParser():
+	# create the top-level parser
+	name = os.path.split(os.path.dirname(sys.argv[0]))[-1]
+	parser    = argparse.ArgumentParser(prog=name, description="ACTION PIPELINE TOOL")
+
+	# Global options
+	parser.add_argument('--version', action=VersionAction)
+	group = parser.add_mutually_exclusive_group()
+	group.add_argument('-v', '--verbose', action='store_true', help='Verbose output.')
+	group.add_argument('-q', '--quiet',   action='store_true', help='Quiet output.')
+	parser.add_argument('-nk','--no-console', action='store_true', help='Do not log to console.')
+	parser.add_argument('--log-file', type=str, default=None, help='Optional log file')
+	add_http_options(parser)
+
+	
+	# --------------------------
+	# Create first level parsers
+	# --------------------------
+	subparser = parser.add_subparsers(dest='command')
+	parser_pipeline = subparser.add_parser('pipeline', help='StreetSpectra pipeline commands')
+	parser_store    = subparser.add_parser('store', help='Local SQLite observation store commands')
+	parser_exports  = subparser.add_parser('exports', help='Exported JSON files commands')
+	
+
+	# -----------------
+	# Pipeline Commands
+	# -----------------
+
+	subparser = parser_pipeline.add_subparsers(dest='subcommand')
+
+	parser_run = subparser.add_parser('run', help='Export Epicollect V entries, transform & upload them to ACTION database in one pass')
+	parser_run.add_argument('-s','--slug',  type=str, required=True, help='Epicollect V project URL fragment')
+	parser_run.add_argument('-p','--page-size',  type=int, default=50, help='Individual Epicollect V request page size')
+	parser_run.add_argument('-sd','--start-date',  type=str, required=True, metavar="<YYYY-MM-DD>", help='Start date')
+	parser_run.add_argument('-ed','--end-date',  type=str, required=True, metavar="<YYYY-MM-DD>", help='End date')
+	parser_run.add_argument('-t','--token', type=str, required=True, help='ACTION database token')
+	parser_run.add_argument('--tps',        type=float, default=DEFAULT_TPS,  help='ACTION database transactions per second')
+	parser_run.add_argument('--export-file',    type=str, default=None, help='Optional JSON file where to save exported entries')
+	parser_run.add_argument('--transform-file', type=str, default=None, help='Optional JSON file where to save transformed observations')
+	parser_run.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE, help='Records buffered between export and upload')
+	parser_run.add_argument('--dedup', type=str, default=None, metavar='<DIRECTORY>', help='Skip observations already uploaded, as recorded in this directory')
+
+	# --------------
+	# Store Commands
+	# --------------
+
+	subparser = parser_store.add_subparsers(dest='subcommand')
+
+	parser_ingest = subparser.add_parser('ingest', help='Ingest a JSON file into the store, updating already stored records')
+	parser_ingest.add_argument('-d','--database', type=str, required=True, help='SQLite store file')
+	parser_ingest.add_argument('-k','--kind', choices=STORE_KINDS, required=True, help='Kind of records')
+	parser_ingest.add_argument('-i','--input-file', type=str, required=True, help='Input JSON file, as written by download, export, transform or classifications commands')
+	parser_ingest.add_argument('-p','--project', type=str, default=None, help='Project the records belong to, if not given in the records')
+
+	parser_query = subparser.add_parser('query', help='Select records from the store')
+	parser_query.add_argument('-d','--database', type=str, required=True, help='SQLite store file')
+	parser_query.add_argument('-k','--kind', choices=STORE_KINDS, required=True, help='Kind of records')
+	parser_query.add_argument('-p','--project', type=str, default=None, help='Optional project')
+	parser_query.add_argument('-sd','--start-date', type=str, default=None, metavar="<YYYY-MM-DD[THH:MM:SS]>", help='Optional start date (inclusive)')
+	parser_query.add_argument('-ed','--end-date', type=str, default=None, metavar="<YYYY-MM-DD[THH:MM:SS]>", help='Optional end date (exclusive)')
+	parser_query.add_argument('-u','--unmatched', action='store_true', help='Only entries without observation, or observations without entry')
+	parser_query.add_argument('-l','--limit', type=int, default=None, help='Optional max. number of records')
+	group = parser_query.add_mutually_exclusive_group()
+	group.add_argument('--bbox', type=float, nargs=4, default=None, metavar=('MIN_LON','MIN_LAT','MAX_LON','MAX_LAT'), help='Only observations inside a bounding box (degrees), crossing the antimeridian if MIN_LON > MAX_LON')
+	group.add_argument('--radius', type=float, nargs=3, default=None, metavar=('LAT','LON','KM'), help='Only observations within a distance of a point')
+	parser_query.add_argument('-o','--output-file', type=str, default=None, help='Output JSON file (default standard output)')
+
+	parser_index = subparser.add_parser('index', help='Rebuild the observations spatial index')
+	parser_index.add_argument('-d','--database', type=str, required=True, help='SQLite store file')
+
+	# ----------------
+	# Exports Commands
+	# ----------------
+
+	subparser = parser_exports.add_subparsers(dest='subcommand')
+
+	parser_diff = subparser.add_parser('diff', help='Compare two exports by id, writing only the added or modified records')
+	parser_diff.add_argument('-k','--kind', choices=STORE_KINDS, required=True, help='Kind of records')
+	parser_diff.add_argument('-a','--old-file', type=str, required=True, help='Previous JSON export')
+	parser_diff.add_argument('-b','--new-file', type=str, required=True, help='New JSON export')
+	parser_diff.add_argument('-o','--output-file', type=str, default=None, help='Optional JSON file where to write added & modified records')
+	parser_diff.add_argument('-r','--removed-file', type=str, default=None, help='Optional JSON file where to write removed records')
+	parser_diff.add_argument('-i','--ignore', type=str, nargs='+', default=None, help='Fields not taken into account when comparing records')
+
+	return parser
+
+# ================ #
+# MAIN ENTRY POINT #
+# ================ #
+
+def main():
+	'''
+	Utility entry point
+	'''
+	try:
+		options = createParser().parse_args(sys.argv[1:])
+		configureLogging(options)
+		setup(options)
+		name = os.path.split(os.path.dirname(sys.argv[0]))[-1]
+		command  = f"{options.command}"
+		subcommand = options.subcommand
+		try:
+			command = importlib.import_module(command, package=name)
+		except ModuleNotFoundError:	# when debugging module in git source tree ...
+			command  = f".{options.command}"
+			command = importlib.import_module(command, package=name)
+		log.info(f"============== {name} {version()} ==============")
+		getattr(command, subcommand)(options)
+	except KeyboardInterrupt as e:
+		log.critical("[%s] Interrupted by user ", __name__)
+	except Exception as e:
+		log.critical("[%s] Fatal error => %s", __name__, str(e) )
+		traceback.print_exc()
+	finally:
+		pass
+
+main()
+
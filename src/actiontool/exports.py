@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+#--------------------
+# System wide imports
+# -------------------
+
+import json
+import logging
+
+#--------------
+# local imports
+# -------------
+
+from tools_actionproject.dedup import content_hash
+from tools_actionproject.jsonstream import iter_json_array
+from .store import record_id
+
+# -----------------------
+# Module global variables
+# -----------------------
+
+log = logging.getLogger("actiontool")
+
+# -------
+# Classes
+# -------
+
+class JSONArrayWriter:
+	'''Writes records one by one as a JSON array file. Without path, records are just counted'''
+
+	def __init__(self, path):
+		self.fd = open(path, 'w') if path is not None else None
+		self.separator = '[\n'
+		self.count = 0
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		if self.fd is not None:
+			self.fd.write('[\n]\n' if self.count == 0 else '\n]\n')
+			self.fd.close()
+
+	def write(self, record):
+		if self.fd is not None:
+			self.fd.write(self.separator)
+			json.dump(record, fp=self.fd)
+			self.separator = ',\n'
+		self.count += 1
+
+# ------------------
+# Auxiliar functions
+# ------------------
+
+def hash_index(path, kind, ignore):
+	'''Index of record id => content hash of an export, read as a stream'''
+	with open(path) as fd:
+		return {record_id(kind, record): content_hash(record, ignore) for record in iter_json_array(fd)}
+
+
+def diff_records(old_path, new_path, kind, changed, removed, ignore=()):
+	'''Streams the records added or modified in the new export to the changed writer
+	and the records missing from the new export to the removed writer.
+	Returns the number of added, modified and removed records'''
+	index = hash_index(old_path, kind, ignore)
+	added = modified = 0
+	with open(new_path) as fd:
+		for record in iter_json_array(fd):
+			ident = record_id(kind, record)
+			previous = index.pop(ident, None)
+			if previous is None:
+				added += 1
+			elif previous != content_hash(record, ignore):
+				modified += 1
+			else:
+				continue
+			changed.write(record)
+	# What is left in the index was not found in the new export
+	if index and removed is not None:
+		with open(old_path) as fd:
+			for record in iter_json_array(fd):
+				if record_id(kind, record) in index:
+					removed.write(record)
+	return added, modified, len(index)
+
+# ----------------------
+# COMMAND IMPLEMENTATION
+# ----------------------
+
+def diff(options):
+	log.info("Comparing {0} {1} with {2}".format(options.kind, options.old_file, options.new_file))
+	ignore = tuple(options.ignore or ())
+	with JSONArrayWriter(options.output_file) as changed, JSONArrayWriter(options.removed_file) as removed:
+		removed = removed if options.removed_file is not None else None	# Spares reading the old export again
+		added, modified, deleted = diff_records(options.old_file, options.new_file, options.kind, changed, removed, ignore)
+	log.info("{0} added, {1} modified, {2} removed {3}".format(added, modified, deleted, options.kind))
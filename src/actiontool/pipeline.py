@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+#--------------------
+# System wide imports
+# -------------------
+
+import json
+import queue
+import logging
+import threading
+
+#--------------
+# local imports
+# -------------
+
+from tools_actionproject import httpcache
+from epi5spectra.entries import get_entries_session, do_get_entries, ec5_remapper
+from mongotool.observations import _get_conn, _upload, _seen_uploads
+
+# -----------------------
+# Module global variables
+# -----------------------
+
+log = logging.getLogger("actiontool")
+
+# ------------------
+# Auxiliar functions
+# ------------------
+
+def tee_json(records, path):
+	'''Passes records through while writing them as a JSON array file, if path is given'''
+	if path is None:
+		yield from records
+		return
+	with open(path, 'w') as fd:
+		fd.write('[')
+		separator = '\n'
+		for record in records:
+			fd.write(separator)
+			json.dump(record, fp=fd)
+			separator = ',\n'
+			yield record
+		fd.write('\n]\n')
+	log.info("Written pipeline records to {0}".format(path))
+
+
+def threaded(records, maxsize):
+	'''Produces records in a background thread through a bounded queue,
+	so that the producer stage overlaps with the consumer stage'''
+	DONE = object()
+	channel = queue.Queue(maxsize=maxsize)
+	failure = list()
+	def producer():
+		try:
+			for record in records:
+				channel.put(record)
+		except Exception as e:
+			failure.append(e)
+		finally:
+			channel.put(DONE)
+	thread = threading.Thread(target=producer, daemon=True)
+	thread.start()
+	while True:
+		record = channel.get()
+		if record is DONE:
+			break
+		yield record
+	thread.join()
+	if failure:
+		raise failure[0]
+
+# ----------------------
+# COMMAND IMPLEMENTATION
+# ----------------------
+
+def run(options):
+	log.info("Running pipeline for Epicollect V slug {0}".format(options.slug))
+	ec5_session, ec5_url, params = get_entries_session(options.slug, options.start_date, options.end_date, options.page_size, httpcache.session(options))
+	entries = tee_json(do_get_entries(ec5_session, ec5_url, params), options.export_file)
+	observations = tee_json(ec5_remapper(entries), options.transform_file)
+	session, url, page_size, limiter = _get_conn(options)
+	seen = _seen_uploads(options)
+	try:
+		count = _upload(threaded(observations, options.queue_size), session, url, page_size, limiter, seen)
+	finally:
+		if seen is not None:
+			seen.close()
+		session.close()
+		ec5_session.close()
+	log.info("Pipeline ended ({1} observations) for slug {0}".format(options.slug, count))
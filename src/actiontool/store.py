@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+#--------------------
+# System wide imports
+# -------------------
+
+import sys
+import json
+import math
+import sqlite3
+import logging
+import itertools
+
+#--------------
+# local imports
+# -------------
+
+from tools_actionproject.jsonstream import iter_json_array
+
+# ----------------
+# Module constants
+# ----------------
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS observation_t
+(
+	id              TEXT PRIMARY KEY,  -- Epicollect V ec5_uuid
+	project         TEXT,
+	source          TEXT,
+	created_at      TEXT,              -- normalized to YYYY-MM-DDTHH:MM:SS
+	uploaded_at     TEXT,
+	data            TEXT               -- whole JSON record
+);
+CREATE INDEX IF NOT EXISTS observation_project_i ON observation_t(project, created_at);
+CREATE INDEX IF NOT EXISTS observation_created_i ON observation_t(created_at);
+
+-- Spatial index of observation locations, as degenerate boxes
+CREATE VIRTUAL TABLE IF NOT EXISTS observation_location_t USING rtree
+(
+	id,                                -- observation_t rowid
+	min_lat, max_lat,
+	min_lon, max_lon
+);
+
+CREATE TABLE IF NOT EXISTS entry_t
+(
+	id              TEXT PRIMARY KEY,  -- ec5_uuid
+	project         TEXT,              -- Epicollect V project slug
+	created_at      TEXT,
+	uploaded_at     TEXT,
+	data            TEXT
+);
+CREATE INDEX IF NOT EXISTS entry_project_i ON entry_t(project, created_at);
+CREATE INDEX IF NOT EXISTS entry_created_i ON entry_t(created_at);
+
+CREATE TABLE IF NOT EXISTS classification_t
+(
+	id              TEXT PRIMARY KEY,
+	project         TEXT,              -- Zooniverse project slug
+	workflow_id     TEXT,
+	subject_id      TEXT,
+	user_id         TEXT,
+	created_at      TEXT,
+	data            TEXT
+);
+CREATE INDEX IF NOT EXISTS classification_project_i ON classification_t(project, created_at);
+CREATE INDEX IF NOT EXISTS classification_created_i ON classification_t(created_at);
+CREATE INDEX IF NOT EXISTS classification_subject_i ON classification_t(subject_id);
+'''
+
+# Stored kinds of record: table and the record keys matched by its id column
+KINDS = {
+	'observations'    : ('observation_t',    ('id',)),
+	'entries'         : ('entry_t',          ('ec5_uuid', 'id')),
+	'classifications' : ('classification_t', ('classification_id', 'id')),
+}
+
+# Records of a kind whose id is matched by the id of the records of another kind
+MATCHES = {
+	'observations' : 'entries',
+	'entries'      : 'observations',
+}
+
+INGEST_BATCH  = 1000     # Records inserted per transaction when ingesting a file
+
+EARTH_RADIUS  = 6371.0   # Km
+KM_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+
+# -----------------------
+# Module global variables
+# -----------------------
+
+log = logging.getLogger("actiontool")
+
+# ------------------
+# Auxiliar functions
+# ------------------
+
+def open_store(path):
+	conn = sqlite3.connect(path)
+	conn.row_factory = sqlite3.Row
+	conn.executescript(SCHEMA)
+	return conn
+
+
+def timestamp(value):
+	'''Normalizes the Epicollect V, ACTION and Zooniverse timestamp formats, so that they sort as text'''
+	return None if value is None else str(value)[:19].replace(' ', 'T')
+
+
+def record_id(kind, record):
+	for key in KINDS[kind][1]:
+		if record.get(key) is not None:
+			return str(record[key])
+	raise ValueError("Record without id: {0}".format(record))
+
+
+def row(kind, record, project):
+	'''Indexed columns and JSON data of a record'''
+	created_at = timestamp(record.get('created_at'))
+	data = json.dumps(record)
+	if kind == 'observations':
+		return (record_id(kind, record), record.get('project', project), record.get('source'),
+			created_at, timestamp(record.get('uploaded_at')), data)
+	if kind == 'entries':
+		return (record_id(kind, record), project, created_at, timestamp(record.get('uploaded_at')), data)
+	subject_ids = str(record.get('subject_ids', '')).split(';')[0] or None
+	return (record_id(kind, record), project, record.get('workflow_id'), subject_ids,
+		record.get('user_id'), created_at, data)
+
+
+def location(record):
+	'''(latitude, longitude) of a transformed observation, or None if not given'''
+	location = record.get('location') or dict()
+	try:
+		return float(location['latitude']), float(location['longitude'])
+	except (KeyError, TypeError, ValueError):
+		return None
+
+
+def index_location(conn, rowid, record):
+	point = location(record)
+	if point is not None:
+		latitude, longitude = point
+		conn.execute("INSERT INTO observation_location_t VALUES (?, ?, ?, ?, ?)",
+			(rowid, latitude, latitude, longitude, longitude))
+
+
+def ingest_records(conn, kind, records, project=None):
+	'''Inserts or updates records. Returns the number of records not previously stored'''
+	if not records:
+		return 0
+	table = KINDS[kind][0]
+	rows = [row(kind, record, project) for record in records]
+	placeholders = ",".join("?" * len(rows[0]))
+	with conn:
+		before = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+		if kind == 'observations':
+			# Replaced rows get a new rowid, so their locations are indexed again
+			for record, values in zip(records, rows):
+				previous = conn.execute("SELECT rowid FROM observation_t WHERE id = ?", (values[0],)).fetchone()
+				if previous is not None:
+					conn.execute("DELETE FROM observation_location_t WHERE id = ?", (previous[0],))
+				cursor = conn.execute(f"INSERT OR REPLACE INTO {table} VALUES ({placeholders})", values)
+				index_location(conn, cursor.lastrowid, record)
+		else:
+			conn.executemany(f"INSERT OR REPLACE INTO {table} VALUES ({placeholders})", rows)
+		after = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+	return after - before
+
+
+def reindex_locations(conn):
+	'''Rebuilds the spatial index from the stored observations. Returns the number of indexed locations'''
+	with conn:
+		conn.execute("DELETE FROM observation_location_t")
+		for result in conn.execute("SELECT rowid, data FROM observation_t").fetchall():
+			index_location(conn, result['rowid'], json.loads(result['data']))
+		return conn.execute("SELECT COUNT(*) FROM observation_location_t").fetchone()[0]
+
+
+def distance(lat1, lon1, lat2, lon2):
+	'''Great circle distance in Km (haversine formula)'''
+	lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+	h = math.sin((lat2 - lat1)/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1)/2)**2
+	return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(h)))
+
+
+def radius_bbox(latitude, longitude, radius):
+	'''Bounding box (min_lon, min_lat, max_lon, max_lat) enclosing a circle of radius Km.
+	Longitudes may go beyond +/-180 near the antimeridian. A circle reaching a pole spans all longitudes'''
+	dlat = radius / KM_PER_DEGREE
+	min_lat, max_lat = latitude - dlat, latitude + dlat
+	if min_lat <= -90.0 or max_lat >= 90.0:
+		return -180.0, max(-90.0, min_lat), 180.0, min(90.0, max_lat)
+	# Longitude of the meridians tangent to the circle
+	sin_dlon = math.sin(radius / EARTH_RADIUS) / math.cos(math.radians(latitude))
+	if sin_dlon >= 1.0:
+		return -180.0, min_lat, 180.0, max_lat
+	dlon = math.degrees(math.asin(sin_dlon))
+	return longitude - dlon, min_lat, longitude + dlon, max_lat
+
+
+def lon_ranges(min_lon, max_lon):
+	'''Longitude ranges within [-180, 180] of a box, split in two when it crosses the antimeridian'''
+	if max_lon - min_lon >= 360.0:
+		return [(-180.0, 180.0)]
+	min_lon = (min_lon + 180.0) % 360.0 - 180.0
+	max_lon = (max_lon + 180.0) % 360.0 - 180.0
+	if min_lon <= max_lon:
+		return [(min_lon, max_lon)]
+	return [(min_lon, 180.0), (-180.0, max_lon)]
+
+
+def select_records(conn, kind, project=None, start_date=None, end_date=None, unmatched=False, limit=None,
+	bbox=None, radius=None):
+	'''Yields the stored records of a kind, ordered by creation date, within [start_date, end_date).
+	Observations may also be selected by bounding box (min_lon, min_lat, max_lon, max_lat)
+	or by radius (latitude, longitude, Km) using the spatial index'''
+	table = KINDS[kind][0]
+	where, params = list(), list()
+	join = ""
+	if radius is not None:
+		bbox = radius_bbox(*radius)
+	if bbox is not None:
+		min_lon, min_lat, max_lon, max_lat = bbox
+		# One spatial index query per longitude range
+		boxes = list()
+		for west, east in lon_ranges(min_lon, max_lon):
+			boxes.append("SELECT id FROM observation_location_t WHERE min_lat >= ? AND max_lat <= ? AND min_lon >= ? AND max_lon <= ?")
+			params.extend((min_lat, max_lat, west, east))
+		join = "JOIN ({0}) AS l ON l.id = t.rowid".format(" UNION ALL ".join(boxes))
+	if project is not None:
+		where.append("t.project = ?")
+		params.append(project)
+	if start_date is not None:
+		where.append("t.created_at >= ?")
+		params.append(timestamp(start_date))
+	if end_date is not None:
+		where.append("t.created_at < ?")
+		params.append(timestamp(end_date))
+	if unmatched:
+		join += f" LEFT JOIN {KINDS[MATCHES[kind]][0]} AS m ON m.id = t.id"
+		where.append("m.id IS NULL")
+	sql = f"SELECT t.data FROM {table} AS t {join}"
+	if where:
+		sql += " WHERE " + " AND ".join(where)
+	sql += " ORDER BY t.created_at"
+	if limit is not None and radius is None:
+		sql += " LIMIT ?"
+		params.append(limit)
+	results = (json.loads(result['data']) for result in conn.execute(sql, params))
+	if radius is not None:
+		# Exact distance check of the bounding box candidates
+		latitude, longitude, km = radius
+		results = (record for record in results if distance(latitude, longitude, *location(record)) <= km)
+		results = results if limit is None else itertools.islice(results, limit)
+	yield from results
+
+# ----------------------
+# COMMAND IMPLEMENTATION
+# ----------------------
+
+def ingest(options):
+	log.info("Ingesting {0} from {1} into {2}".format(options.kind, options.input_file, options.database))
+	total, count = 0, 0
+	conn = open_store(options.database)
+	try:
+		with open(options.input_file) as fd:
+			records = iter_json_array(fd)
+			batch = list(itertools.islice(records, INGEST_BATCH))
+			while batch:
+				count += ingest_records(conn, options.kind, batch, options.project)
+				total += len(batch)
+				batch = list(itertools.islice(records, INGEST_BATCH))
+	finally:
+		conn.close()
+	log.info("Ingested {0} {1} ({2} new)".format(total, options.kind, count))
+
+
+def query(options):
+	if options.unmatched and options.kind not in MATCHES:
+		raise ValueError("--unmatched only applies to {0}".format(" & ".join(MATCHES)))
+	if (options.bbox or options.radius) and options.kind != 'observations':
+		raise ValueError("--bbox & --radius only apply to observations")
+	conn = open_store(options.database)
+	records = list(select_records(conn, options.kind, options.project, options.start_date, options.end_date,
+		options.unmatched, options.limit, options.bbox, options.radius))
+	conn.close()
+	if options.output_file is None:
+		json.dump(records, fp=sys.stdout, indent=2)
+		sys.stdout.write('\n')
+	else:
+		with open(options.output_file, 'w') as fd:
+			json.dump(records, fp=fd, indent=2)
+	log.info("Selected {0} {1}".format(len(records), options.kind))
+
+
+def index(options):
+	log.info("Rebuilding observations spatial index in {0}".format(options.database))
+	conn = open_store(options.database)
+	count = reindex_locations(conn)
+	conn.close()
+	log.info("Indexed {0} observation locations".format(count))
@@ -18,7 +18,7 @@
 # local imports
 # -------------
 
-from tools_actionproject._version import get_versions
+from tools_actionproject.cli import lazy_version
 
 
 # -----------------------
@@ -30,6 +30,4 @@ from tools_actionproject._version import get_versions
 # ----------------
 
 
-__version__ = get_versions()['version']
-
-del get_versions
+__getattr__ = lazy_version(__name__)
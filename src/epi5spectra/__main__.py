@@ -22,7 +22,7 @@ import importlib
 # Local imports
 # -------------
 
-from . import  __version__
+from tools_actionproject.cli import version, VersionAction, add_http_options, apply_http_options
 
 
 # -----------------------
@@ -69,6 +69,7 @@ def python2_warning():
 
 def setup(options):
 	python2_warning()
+	apply_http_options(options)
 	
 
 # =================== #
@@ -81,12 +82,13 @@ def createParser():
 	parser    = argparse.ArgumentParser(prog=name, description="EPICOLLECT 5 TOOL")
 
 	# Global options
-	parser.add_argument('--version', action='version', version='{0} {1}'.format(name, __version__))
+	parser.add_argument('--version', action=VersionAction)
 	group = parser.add_mutually_exclusive_group()
 	group.add_argument('-v', '--verbose', action='store_true', help='Verbose output.')
 	group.add_argument('-q', '--quiet',   action='store_true', help='Quiet output.')
 	parser.add_argument('-nk','--no-console', action='store_true', help='Do not log to console.')
 	parser.add_argument('--log-file', type=str, default=None, help='Optional log file')
+	add_http_options(parser)
 
 	
 	# --------------------------
@@ -108,10 +110,20 @@ def createParser():
 	parser_export.add_argument('-sd','--start-date',  type=str, required=True, metavar="<YYYY-MM-DD>", help='Start date')
 	parser_export.add_argument('-ed','--end-date',  type=str, required=True, metavar="<YYYY-MM-DD>", help='End date')
 	parser_export.add_argument('-f','--file',  type=str, required=True, help='Output JSON file')
+	parser_export.add_argument('--aio', action='store_true', help='Use the asynchronous HTTP core (needs aiohttp)')
 
 	parser_transf = subparser.add_parser('transform', help='Transform Epicollect exported entries to ACTION format')
 	parser_transf.add_argument('-i','--input-file',  type=str, required=True, help='Input JSON file')
 	parser_transf.add_argument('-o','--output-file', type=str, required=True, help='Output JSON file')
+	parser_transf.add_argument('-r','--records-file', type=str, default=None, help='Optional record file with random access by id')
+	parser_transf.add_argument('--dedup', type=str, default=None, metavar='<DIRECTORY>', help='Skip entries already transformed, as recorded in this directory')
+
+	parser_lookup = subparser.add_parser('lookup', help='Read transformed entries from a record file, by id or by position range')
+	parser_lookup.add_argument('-r','--records-file', type=str, required=True, help='Input record file')
+	parser_lookup.add_argument('-i','--id', type=str, nargs='+', default=None, help='Ids (ec5_uuid) of the records to read')
+	parser_lookup.add_argument('-s','--start', type=int, default=None, help='First record position, if not reading by id')
+	parser_lookup.add_argument('-e','--end', type=int, default=None, help='Last record position (exclusive), if not reading by id')
+	parser_lookup.add_argument('-o','--output-file', type=str, default=None, help='Output JSON file (default standard output)')
 
 	return parser
 
@@ -135,7 +147,7 @@ def main():
 		except ModuleNotFoundError:	# when debugging module in git source tree ...
 			command  = f".{options.command}"
 			command = importlib.import_module(command, package=name)
-		log.info(f"============== {name} {__version__} ==============")
+		log.info(f"============== {name} {version()} ==============")
 		getattr(command, subcommand)(options)
 	except KeyboardInterrupt as e:
 		log.critical("[%s] Interrupted by user ", __name__)
@@ -10,13 +10,19 @@
 # System wide imports
 # -------------------
 
+import sys
 import json
-import time
 import logging
 import datetime
 
 import requests
 
+#--------------
+# local imports
+# -------------
+
+from tools_actionproject import aio, retry, httpcache, records, dedup
+
 # ----------------
 # Module constants
 # ----------------
@@ -33,9 +39,9 @@ log = logging.getLogger("epi5")
 # ----------------------
 
 
-def get_entries_session(slug,  start_date, end_date, page_size):
+def get_entries_session(slug,  start_date, end_date, page_size, session=None):
 	url = f"{ENDPOINT}/{slug}"
-	session = requests.Session()
+	session = session or requests.Session()
 	params = {
 			"per_page"   : page_size,
 			"filter_by"  : "created_at",
@@ -50,10 +56,9 @@ def get_entries_session(slug,  start_date, end_date, page_size):
 def do_get_entries(session, url, params):
 	while url is not None:
 		log.debug("Requesting page")
-		response = session.get(url, params=params)
-		response.raise_for_status()
+		# Rate limited to comply with Epic Collect V 1 TPS, only this page is retried on failure
+		response = retry.request(session, 'GET', url, params=params)
 		response_json = response.json()
-		time.sleep(1)	# To comply with Epic Collect V 1 TPS rate limiting.
 		#print(json.dumps(response_json, indent=4, sort_keys=False))
 		url  = response_json["links"]["next"]
 		page = response_json["meta"]["current_page"]
@@ -61,6 +66,16 @@ def do_get_entries(session, url, params):
 		yield from response_json["data"]["entries"]
 
 
+def next_page(page, url, params):
+	'''Epicollect V pagination. The next page link already includes the query parameters'''
+	return page["data"]["entries"], page["links"]["next"], None
+
+
+def aio_get_entries(url, params):
+	'''Same as do_get_entries, but driven by the asynchronous HTTP core'''
+	return aio.iterate(lambda client: client.paginate(url, params, next_page))
+
+
 
 NAME_MAP = {
 		'ec5_uuid'            : 'id',
@@ -121,10 +136,18 @@ def ec5_remapper(entries):
 # ----------------------
 
 def export(options):
+	if options.aio and options.http_cache is not None:
+		raise ValueError("--http-cache is not supported by the asynchronous HTTP core (--aio)")
 	log.info("Getting Epicollect V Entries for slug {0}".format(options.slug))
 	with open(options.file,'w') as fd:
-		session, url, params = get_entries_session(options.slug,options.start_date, options.end_date, options.page_size)
-		entries = list(do_get_entries(session, url, params))
+		session, url, params = get_entries_session(options.slug,options.start_date, options.end_date, options.page_size, httpcache.session(options))
+		try:
+			if options.aio:
+				entries = list(aio_get_entries(url, params))
+			else:
+				entries = list(do_get_entries(session, url, params))
+		finally:
+			session.close()
 		json.dump(entries, fd, indent="")
 	log.info("Epicollect V export ended ({1} entries) for slug {0}".format(options.slug, len(entries)))
 
@@ -133,7 +156,41 @@ def transform(options):
 	log.info("Transforming Epicollect V Entries for input file {0}".format(options.input_file))
 	with open(options.input_file) as fd:
 		entries = json.load(fd)
-	result = list(ec5_remapper(entries))
-	with open(options.output_file,'w') as fd:
-		json.dump(result, fp=fd, indent=2)
+	seen = dedup.SeenSet(options.dedup, 'entries') if options.dedup else None
+	try:
+		if seen is not None:
+			pairs = list(dedup.unique(entries, seen, 'ec5_uuid'))
+			keys, entries = [key for key, _ in pairs], [entry for _, entry in pairs]
+			log.info("Skipped {0} entries already transformed".format(seen.duplicates))
+		result = list(ec5_remapper(entries))
+		with open(options.output_file,'w') as fd:
+			json.dump(result, fp=fd, indent=2)
+		if options.records_file:
+			records.write_records(options.records_file, result, key='id')
+		if seen is not None:
+			# Only marked as transformed once the output files are written
+			seen.update(keys)
+	finally:
+		if seen is not None:
+			seen.close()
 	log.info("Epicollect V transform ended")
+
+
+def lookup(options):
+	log.info("Looking up records in {0}".format(options.records_file))
+	with records.RecordFile(options.records_file) as record_file:
+		if options.id:
+			result = [record_file.get(record_id) for record_id in options.id]
+			for record_id, record in zip(options.id, result):
+				if record is None:
+					log.warning("Record {0} not found".format(record_id))
+			result = [record for record in result if record is not None]
+		else:
+			result = record_file[options.start:options.end]
+	if options.output_file is None:
+		json.dump(result, fp=sys.stdout, indent=2)
+		sys.stdout.write('\n')
+	else:
+		with open(options.output_file,'w') as fd:
+			json.dump(result, fp=fd, indent=2)
+	log.info("Found {0} records".format(len(result)))
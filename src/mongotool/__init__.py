@@ -20,7 +20,7 @@ import datetime
 # local imports
 # -------------
 
-from tools_actionproject._version import get_versions
+from tools_actionproject.cli import lazy_version
 
 
 # -----------------------
@@ -42,7 +42,4 @@ DEFAULT_START_DATE = datetime.datetime(year=2019,month=1,day=1)
 DEFAULT_END_DATE   = datetime.datetime(year=2999,month=12,day=31)
 
 
-
-__version__ = get_versions()['version']
-
-del get_versions
+__getattr__ = lazy_version(__name__)
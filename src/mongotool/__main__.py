@@ -22,7 +22,8 @@ import traceback
 # Local imports
 # -------------
 
-from . import  __version__, DEFAULT_TPS, DEFAULT_LIMIT, DEFAULT_START_DATE, DEFAULT_END_DATE, DEFAULT_PGSZ
+from tools_actionproject.cli import version, VersionAction, add_http_options, apply_http_options
+from . import  DEFAULT_TPS, DEFAULT_LIMIT, DEFAULT_START_DATE, DEFAULT_END_DATE, DEFAULT_PGSZ
 
 
 # -----------------------
@@ -69,6 +70,7 @@ def python2_warning():
 
 def setup(options):
     python2_warning()
+    apply_http_options(options)
     
 def mkdate(datestr):
     try:
@@ -88,12 +90,13 @@ def createParser():
     parser    = argparse.ArgumentParser(prog=name, description="MONGO DATABASE TOOL")
 
     # Global options
-    parser.add_argument('--version', action='version', version='{0} {1}'.format(name, __version__))
+    parser.add_argument('--version', action=VersionAction)
     group = parser.add_mutually_exclusive_group()
     group.add_argument('-v', '--verbose', action='store_true', help='Verbose output.')
     group.add_argument('-q', '--quiet',   action='store_true', help='Quiet output.')
     parser.add_argument('-nk','--no-console', action='store_true', help='Do not log to console.')
     parser.add_argument('--log-file', type=str, default=None, help='Optional log file')
+    add_http_options(parser)
 
     
     # --------------------------
@@ -117,6 +120,7 @@ def createParser():
     parser_download.add_argument('-e','--end-date',   type=mkdate, metavar='<YYYY-MM-DD|YYYY-MM-DDTHH:MM:SS>', default=DEFAULT_END_DATE, help='end date')
     parser_download.add_argument('-l','--limit',      type=int, default=DEFAULT_LIMIT,  help='max number of observations to download')
     parser_download.add_argument('--page-size',       type=int, default=DEFAULT_PGSZ,  help='Page size for individual HTTP request')
+    parser_download.add_argument('--tps',             type=float, default=DEFAULT_TPS,  help='Transactions per second')
    
 
     parser_upload = subparser.add_parser('upload', help='Export project classifications')
@@ -124,6 +128,7 @@ def createParser():
     parser_upload.add_argument('-f','--file',  type=str, required=True, help='Input JSON file where to upload observations')
     parser_upload.add_argument('--tps',        type=float, default=DEFAULT_TPS,  help='Transactions per second')
     parser_upload.add_argument('--page-size',  type=int, default=DEFAULT_PGSZ,  help='Page size for individual HTTP request')
+    parser_upload.add_argument('--dedup',      type=str, default=None, metavar='<DIRECTORY>', help='Skip observations already uploaded, as recorded in this directory')
 
     return parser
     
@@ -148,7 +153,7 @@ def main():
         except ModuleNotFoundError: # when debugging module in git source tree ...
             command  = f".{options.command}"
             command = importlib.import_module(command, package=name)
-        log.info(f"============== {name} {__version__} ==============")
+        log.info(f"============== {name} {version()} ==============")
         getattr(command, subcommand)(options)
     except KeyboardInterrupt as e:
         log.critical("[%s] Interrupted by user ", __name__)
@@ -12,11 +12,14 @@
 
 import os
 import json
-import time
 import logging
 import datetime
 
-import requests
+#--------------
+# local imports
+# -------------
+
+from tools_actionproject import ratelimit, retry, httpcache, dedup
 
 # ----------------
 # Module constants
@@ -35,33 +38,31 @@ log = logging.getLogger("action")
 # ------------------
 
 def _get_conn(options):
-    delay    = 1.0/options.tps
     page_size = options.page_size
     base_url = DEFAULT_URL
-    session  = requests.Session()
+    limiter  = ratelimit.configure(base_url, rate=options.tps)
+    session  = httpcache.session(options)
     session.headers.update({'Authorization': f"Bearer {options.token}"})
-    return session, base_url, page_size, delay
+    return session, base_url, page_size, limiter
 
 
 # For download
 
-def _do_get_entries(session, url, params, limit, delay):
+def _do_get_entries(session, url, params, limit, limiter):
     '''Get connection details valid for both upload and download'''
     offset = 0
     while offset < limit:
         log.info(f"Requesting page {url}")
-        response = session.get(
-            url, params={**params, **{"page": offset}}
+        response = retry.request(
+            session, 'GET', url, limiter=limiter, params={**params, **{"page": offset}}
         )
-        response.raise_for_status()
         response_json = response.json()
-        time.sleep(delay) 
-        log.debug(f"Page {page} received")
+        log.debug(f"Page {offset} received")
         yield from response_json["result"]
         offset += params["limit"]
 
 
-def _download(start_datetime, end_datetime, project, limit, obs_type, page_size, delay):
+def _download(session, url, start_datetime, end_datetime, project, limit, obs_type, page_size, limiter):
     log.info(f"Getting Observations from ACTION Database for {project}")
     params = {
         "begin_date" : start_datetime,
@@ -70,7 +71,7 @@ def _download(start_datetime, end_datetime, project, limit, obs_type, page_size,
         "project"    : project,
         "obs_type"   : obs_type,
     }
-    yield from _do_get_entries(session, url, params, limit, page_size, delay)
+    yield from _do_get_entries(session, url, params, limit, limiter)
 
 
 def _dbg_request(response):
@@ -82,15 +83,33 @@ def _dbg_request(response):
     
    
 
-def _upload(observations, session, url, page_size, delay):
-    
-    log.info(f"Uploading {len(observations)} observations to ACTION Database")
+def _upload(observations, session, url, page_size, limiter, seen=None):
+    '''Uploads observations from any iterable, so that they can be streamed. Returns the number uploaded.
+    If given a dedup.SeenSet, observations already uploaded are skipped'''
+    log.info("Uploading observations to ACTION Database")
+    count = 0
     for observation in observations:
+        if seen is not None:
+            key = dedup.record_key(observation, 'id', ignore=('written_at',))
+            if key in seen:
+                seen.duplicates += 1
+                continue
         observation["written_at"] = datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S UTC")
-        response = session.post(url, json=observation)
+        response = retry.request(session, 'POST', url, limiter=limiter, json=observation)
         _dbg_request(response)
-        response.raise_for_status()
-        time.sleep(delay)
+        if seen is not None:
+            # Only marked as uploaded once the upload succeeded
+            seen.add(key)
+            seen.commit()
+        count += 1
+    log.info(f"Uploaded {count} observations to ACTION Database")
+    if seen is not None:
+        log.info(f"Skipped {seen.duplicates} observations already uploaded")
+    return count
+
+
+def _seen_uploads(options):
+    return dedup.SeenSet(options.dedup, 'uploads') if options.dedup else None
 
 # ----------------------
 # Command implementation
@@ -101,30 +120,42 @@ def upload(options):
     with open(options.file) as fd:
         observations = json.load(fd)
         log.info(f"Parsed {len(observations)} observations from {options.file}")
-    session, url, page_size, delay = _get_conn(options)
-    _upload(observations, session, url, page_size, delay)
+    session, url, page_size, limiter = _get_conn(options)
+    seen = _seen_uploads(options)
+    try:
+        _upload(observations, session, url, page_size, limiter, seen)
+    finally:
+        if seen is not None:
+            seen.close()
+        session.close()
 
 
 
 def download(options):
     log.info(f"Downloading observations to {options.file}")
-    session, base_url, page_size, delay = _get_conn(options)
-    observations = list(
-        _download(
-            start_datetime = options.start_date.strfmt("&Y-%m-%dT%H:%M:%SZ"),
-            end_datetime   = options.end_date.strfmt("&Y-%m-%dT%H:%M:%SZ"),
-            project        = options.project,
-            limit          = options.limit,
-            obs_type       = 'observations',
-            page_size      = options.page_size,
-            delay          = delay,
+    session, base_url, page_size, limiter = _get_conn(options)
+    try:
+        observations = list(
+            _download(
+                session        = session,
+                url            = base_url,
+                start_datetime = options.start_date.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                end_datetime   = options.end_date.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                project        = options.project,
+                limit          = options.limit,
+                obs_type       = 'observations',
+                page_size      = options.page_size,
+                limiter        = limiter,
+            )
         )
-    )
+    finally:
+        session.close()
     log.info(f"Fetched {len(observations)} entries")
     # Make sure the output directory exists.
     output_dir = os.path.dirname(options.file)
-    os.makedirs(output_dir, exist_ok=True)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
     with open(options.file, "w") as fd:
         json.dump(observations, indent="",fp=fd)
-        self.log.info(f"Written entries to {options.file}")
+        log.info(f"Written entries to {options.file}")
   
\ No newline at end of file
@@ -25,3 +25,7 @@
 # ----------------
 # Module constants
 # ----------------
+
+# Kept here so that command line parsers do not need to import the HTTP cache (and requests)
+DEFAULT_HTTP_CACHE_TTL  = 24*60*60  # Seconds a cached response is served
+DEFAULT_HTTP_CACHE_SIZE = 512       # Max. cache size in MB
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+# Asynchronous HTTP core shared by the API clients.
+# It needs the optional aiohttp package (pip install aiohttp).
+
+#--------------------
+# System wide imports
+# -------------------
+
+import queue
+import asyncio
+import logging
+import threading
+
+try:
+	import aiohttp
+except ImportError:
+	aiohttp = None
+
+#--------------
+# local imports
+# -------------
+
+from . import ratelimit
+from .retry import DEFAULT_RETRIES, IDEMPOTENT, backoff, retry_after, retry_status
+
+# ----------------
+# Module constants
+# ----------------
+
+DEFAULT_CONCURRENCY = 10    # Max. simultaneous connections per client
+DEFAULT_QUEUE       = 1000  # Items buffered by the synchronous wrappers
+
+# -----------------------
+# Module global variables
+# -----------------------
+
+log = logging.getLogger("aio")
+
+# -------
+# Classes
+# -------
+
+class Client:
+	'''Asynchronous HTTP client with shared rate limiting, retries and pagination.
+	Use it as an async context manager'''
+
+	def __init__(self, headers=None, retries=DEFAULT_RETRIES, concurrency=DEFAULT_CONCURRENCY):
+		if aiohttp is None:
+			raise ImportError("The asynchronous HTTP core needs the aiohttp package")
+		self.headers     = headers
+		self.retries     = retries
+		self.concurrency = concurrency
+		self.session     = None
+
+	async def __aenter__(self):
+		connector = aiohttp.TCPConnector(limit=self.concurrency)
+		self.session = aiohttp.ClientSession(headers=self.headers, connector=connector)
+		return self
+
+	async def __aexit__(self, *exc):
+		await self.session.close()
+
+	async def request(self, method, url, **kwargs):
+		'''Performs a rate limited request returning the decoded JSON response.
+		Throttling, server errors and connection errors are retried with exponential backoff,
+		non idempotent requests only when they were not processed by the server'''
+		for attempt in range(self.retries + 1):
+			delay = backoff(attempt)
+			# Reserving may wait for the lock of a bucket shared between processes
+			wait = await asyncio.get_running_loop().run_in_executor(None, ratelimit.limiter(url).reserve)
+			await asyncio.sleep(wait)
+			try:
+				async with self.session.request(method, url, **kwargs) as response:
+					if retry_status(method, response.status) and attempt < self.retries:
+						delay = retry_after(response.headers, delay)
+						log.warning("{0} {1} => HTTP {2}. Retrying in {3:.1f} s".format(method, url, response.status, delay))
+					else:
+						response.raise_for_status()
+						return await response.json(content_type=None)
+			except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+				if attempt == self.retries or not (method.upper() in IDEMPOTENT or isinstance(e, aiohttp.ClientConnectorError)):
+					raise
+				log.warning("{0} {1} => {2}. Retrying in {3:.1f} s".format(method, url, e, delay))
+			await asyncio.sleep(delay)
+
+	async def get_json(self, url, params=None):
+		return await self.request('GET', url, params=params)
+
+	async def paginate(self, url, params, next_page):
+		'''Asynchronous generator over the items of a paginated resource.
+		next_page(page, url, params) returns the page items and the next (url, params),
+		with a None url after the last page'''
+		while url is not None:
+			page = await self.get_json(url, params=params)
+			items, url, params = next_page(page, url, params)
+			for item in items:
+				yield item
+
+# ------------------
+# Auxiliar functions
+# ------------------
+
+def iterate(function, **client_options):
+	'''Synchronous wrapper: lazily yields the items of the asynchronous iterator function(client),
+	driven by an event loop in a background thread'''
+	DONE = object()
+	channel = queue.Queue(maxsize=DEFAULT_QUEUE)
+	failure = list()
+	async def main():
+		async with Client(**client_options) as client:
+			async for item in function(client):
+				channel.put(item)	# Blocks the loop when the consumer lags behind
+	def loop():
+		try:
+			asyncio.run(main())
+		except Exception as e:
+			failure.append(e)
+		finally:
+			channel.put(DONE)
+	thread = threading.Thread(target=loop, daemon=True)
+	thread.start()
+	while True:
+		item = channel.get()
+		if item is DONE:
+			break
+		yield item
+	thread.join()
+	if failure:
+		raise failure[0]
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+# Startup time benchmark for the tools command line entry points.
+# Usage: python -m tools_actionproject.benchmark [--runs N] [--importtime]
+
+#--------------------
+# System wide imports
+# -------------------
+
+import sys
+import time
+import argparse
+import subprocess
+
+# ----------------
+# Module constants
+# ----------------
+
+TOOLS     = ('mongotool', 'epi5spectra', 'zoonispectra', 'actiontool')
+ARGUMENTS = (('--help',), ('--version',))
+TARGET    = 0.100 # Startup time target in seconds
+TOP       = 10    # Slowest imports shown with --importtime
+
+# ------------------
+# Auxiliar functions
+# ------------------
+
+def timeit(argv, runs):
+	'''Returns the best and mean wall time of running a command several times'''
+	times = list()
+	for _ in range(runs):
+		start = time.perf_counter()
+		subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+		times.append(time.perf_counter() - start)
+	return min(times), sum(times)/len(times)
+
+
+def slowest_imports(argv):
+	'''Returns the slowest (cumulative time in us, module) imports of a command, using -X importtime'''
+	result = subprocess.run([argv[0], '-X', 'importtime'] + argv[1:], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+	imports = list()
+	for line in result.stderr.splitlines():
+		if not line.startswith('import time:') or 'cumulative' in line:
+			continue
+		_, cumulative, module = line[len('import time:'):].split('|')
+		imports.append((int(cumulative), module.rstrip()))
+	return sorted(imports, reverse=True)[:TOP]
+
+# ================ #
+# MAIN ENTRY POINT #
+# ================ #
+
+def main():
+	parser = argparse.ArgumentParser(prog='benchmark', description="TOOLS STARTUP BENCHMARK")
+	parser.add_argument('-r', '--runs', type=int, default=10, help='Runs per command')
+	parser.add_argument('-i', '--importtime', action='store_true', help='Show the slowest imports of each command')
+	parser.add_argument('tools', nargs='*', default=TOOLS, help='Tools to benchmark')
+	options = parser.parse_args(sys.argv[1:])
+	baseline, _ = timeit([sys.executable, '-c', 'pass'], options.runs)
+	print("Python interpreter startup: {0:.1f} ms".format(1000*baseline))
+	failed = False
+	for tool in options.tools:
+		for arguments in ARGUMENTS:
+			argv = [sys.executable, '-m', tool, *arguments]
+			best, mean = timeit(argv, options.runs)
+			ok = best < TARGET
+			failed = failed or not ok
+			print("{0} {1}: best {2:.1f} ms, mean {3:.1f} ms [{4}]".format(
+				tool, " ".join(arguments), 1000*best, 1000*mean, "OK" if ok else "SLOW"))
+			if options.importtime:
+				for cumulative, module in slowest_imports(argv):
+					print("    {0:8.1f} ms {1}".format(cumulative/1000, module))
+	sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+# Helpers shared by the tools command line entry points.
+# They must stay cheap to import, as they run on every tool invocation.
+
+#--------------------
+# System wide imports
+# -------------------
+
+import argparse
+
+# -----------------------
+# Module global variables
+# -----------------------
+
+_version = None
+
+# ------------------
+# Auxiliar functions
+# ------------------
+
+def version():
+	'''Package version, computed once and only when needed.
+	In a git source tree this invokes git, while installed builds have it baked in'''
+	global _version
+	if _version is None:
+		from ._version import get_versions
+		_version = get_versions()['version']
+	return _version
+
+
+def lazy_version(module_name):
+	'''Module level __getattr__ giving a lazy __version__ attribute,
+	so that importing a package does not invoke git. Use it as:
+	__getattr__ = lazy_version(__name__)'''
+	def __getattr__(name):
+		if name == '__version__':
+			return version()
+		raise AttributeError("module {0!r} has no attribute {1!r}".format(module_name, name))
+	return __getattr__
+
+
+def add_http_options(parser):
+	'''Adds the rate limiting and HTTP cache options of the tools calling HTTP APIs'''
+	from . import ratelimit, DEFAULT_HTTP_CACHE_TTL, DEFAULT_HTTP_CACHE_SIZE
+	group = parser.add_mutually_exclusive_group()
+	group.add_argument('--rate-dir', type=str, default=None, help='Directory where rate limits are shared with other processes (default ${0} or {1})'.format(ratelimit.DIR_ENV, ratelimit.DEFAULT_RATE_DIR))
+	group.add_argument('--no-shared-rate', action='store_true', help='Do not share rate limits with other processes')
+	parser.add_argument('--http-cache', type=str, default=None, help='Optional directory caching HTTP GET responses between runs')
+	parser.add_argument('--http-cache-ttl', type=int, default=DEFAULT_HTTP_CACHE_TTL, help='Seconds a cached HTTP response is used (default %(default)s)')
+	parser.add_argument('--http-cache-size', type=int, default=DEFAULT_HTTP_CACHE_SIZE, help='Max. HTTP cache size in MB (default %(default)s)')
+
+
+def apply_http_options(options):
+	'''Applies the rate limiting options. HTTP cache options are read by httpcache.session()'''
+	from . import ratelimit
+	if options.no_shared_rate:
+		ratelimit.set_state_dir(None)
+	elif options.rate_dir is not None:
+		ratelimit.set_state_dir(options.rate_dir)
+
+# -------
+# Classes
+# -------
+
+class VersionAction(argparse.Action):
+	'''Like argparse 'version' action, but getting the version only when requested'''
+
+	def __init__(self, option_strings, dest=argparse.SUPPRESS, default=argparse.SUPPRESS, help="show program's version number and exit"):
+		super().__init__(option_strings=option_strings, dest=dest, default=default, nargs=0, help=help)
+
+	def __call__(self, parser, namespace, values, option_string=None):
+		print('{0} {1}'.format(parser.prog, version()))
+		parser.exit()
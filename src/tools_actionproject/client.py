@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+# Thin client for the tools daemon. Only a few standard library modules
+# are imported here to keep startup time low. When no daemon is listening,
+# the tool is run as a regular "python -m <tool>" process.
+
+#--------------------
+# System wide imports
+# -------------------
+
+import os
+import sys
+import json
+import array
+import socket
+
+# ----------------
+# Module constants
+# ----------------
+
+DEFAULT_SOCKET = os.path.join(os.path.expanduser('~'), '.cache', 'tools-actionproject', 'daemon.sock')
+SOCKET_ENV     = 'ACTIONPROJECT_SOCKET'
+
+# Client standard input, output and error are passed as file descriptors
+NUM_FDS = 3
+
+# ------------------
+# Auxiliar functions
+# ------------------
+
+def socket_path(path=None):
+	return path or os.environ.get(SOCKET_ENV, DEFAULT_SOCKET)
+
+
+def send_request(sock, request, fds):
+	'''Sends a JSON request together with the given file descriptors'''
+	data = json.dumps(request).encode('utf-8') + b'\n'
+	sock.sendmsg([data], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', fds))])
+
+# ================ #
+# MAIN ENTRY POINT #
+# ================ #
+
+def main():
+	'''
+	Client entry point: python -m tools_actionproject.client <tool> [args ...]
+	'''
+	tool, argv = sys.argv[1], sys.argv[2:]
+	sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		sock.connect(socket_path())
+	except OSError:
+		sock.close()
+		os.execvp(sys.executable, [sys.executable, '-m', tool] + argv)
+	request = {'tool': tool, 'argv': argv, 'cwd': os.getcwd(), 'env': dict(os.environ)}
+	send_request(sock, request, [sys.stdin.fileno(), sys.stdout.fileno(), sys.stderr.fileno()])
+	response = sock.makefile('rb').readline()
+	if not response:
+		sys.exit("Connection to tools daemon lost")
+	sys.exit(json.loads(response.decode('utf-8'))['exit'])
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+#--------------------
+# System wide imports
+# -------------------
+
+import os
+import re
+import sys
+import json
+import runpy
+import array
+import socket
+import logging
+import argparse
+import importlib
+import socketserver
+
+#--------------
+# local imports
+# -------------
+
+from .cli import version
+from .client import DEFAULT_SOCKET, SOCKET_ENV, NUM_FDS, socket_path
+
+# ----------------
+# Module constants
+# ----------------
+
+# Tools that can be run by the daemon
+TOOLS = ('mongotool', 'epi5spectra', 'zoonispectra', 'actiontool')
+
+# Command and subcommand names, as logged by the daemon
+COMMAND = re.compile(r'^[a-z][a-z0-9_-]*$')
+
+# Modules imported once by the daemon and shared by every forked command
+WARM_MODULES = (
+	'mongotool', 'mongotool.observations',
+	'epi5spectra', 'epi5spectra.entries',
+	'zoonispectra', 'zoonispectra.project', 'zoonispectra.workflow', 'zoonispectra.subjectsets',
+	'actiontool', 'actiontool.pipeline', 'actiontool.store', 'actiontool.exports',
+)
+
+MAX_MSG = 64*1024
+
+# -----------------------
+# Module global variables
+# -----------------------
+
+log = logging.getLogger("actiond")
+
+# ------------------
+# Auxiliar functions
+# ------------------
+
+def receive_request(sock):
+	'''Receives a JSON request together with the file descriptors sent along'''
+	fds = array.array('i')
+	data, ancdata, _, _ = sock.recvmsg(MAX_MSG, socket.CMSG_LEN(NUM_FDS * fds.itemsize))
+	for level, kind, cmsg_data in ancdata:
+		if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+			fds.frombytes(cmsg_data[:len(cmsg_data) - (len(cmsg_data) % fds.itemsize)])
+	while not data.endswith(b'\n'):
+		chunk = sock.recv(MAX_MSG)
+		if not chunk:
+			raise ValueError("Incomplete request")
+		data += chunk
+	return json.loads(data.decode('utf-8')), list(fds)
+
+
+def warm_up():
+	'''Imports the tools modules and their dependencies before serving commands'''
+	for name in WARM_MODULES:
+		try:
+			importlib.import_module(name)
+		except ImportError as e:
+			log.warning("Could not preload module {0} => {1}".format(name, e))
+		else:
+			log.debug("Preloaded module {0}".format(name))
+	log.info("Tools version {0}".format(version()))
+
+
+def describe(request):
+	'''Tool and command words of a request, for logging. Options, their values and
+	the client environment are never logged, as they may hold passwords or tokens'''
+	tool = request.get('tool')
+	tool = tool if tool in TOOLS else '<unknown tool>'
+	argv = request.get('argv') if isinstance(request.get('argv'), list) else []
+	words = [arg for arg in argv if isinstance(arg, str) and COMMAND.match(arg)][:2]
+	return " ".join([tool] + words)
+
+
+def run_tool(request):
+	'''Runs a tool command as if it were "python -m <tool> <argv>". Returns its exit code'''
+	os.chdir(request['cwd'])
+	os.environ.clear()
+	os.environ.update(request['env'])
+	sys.argv = [request['tool']] + request['argv']
+	try:
+		runpy.run_module(request['tool'], run_name='__main__', alter_sys=True)
+	except SystemExit as e:
+		return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+	finally:
+		sys.stdout.flush()
+		sys.stderr.flush()
+	return 0
+
+# -------
+# Classes
+# -------
+
+class CommandHandler(socketserver.BaseRequestHandler):
+	'''Runs a single command in a forked process with the client standard streams'''
+
+	def handle(self):
+		request, fds = receive_request(self.request)
+		try:
+			if request.get('tool') not in TOOLS or len(fds) != NUM_FDS:
+				log.error("Rejecting request for {0} with {1} file descriptors".format(describe(request), len(fds)))
+				code = 2
+			else:
+				log.info("Running {0}".format(describe(request)))
+				sys.stdout.flush()
+				sys.stderr.flush()
+				for target, fd in enumerate(fds):
+					os.dup2(fd, target)
+				code = run_tool(request)
+		except Exception as e:
+			log.exception("Error running {0}".format(describe(request)))
+			code = 1
+		finally:
+			for fd in fds:
+				os.close(fd)
+		self.request.sendall(json.dumps({'exit': code}).encode('utf-8') + b'\n')
+
+
+class CommandServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+	'''Forks a warm copy of the daemon for each command'''
+	pass
+
+# =================== #
+# THE ARGUMENT PARSER #
+# =================== #
+
+def createParser():
+	parser = argparse.ArgumentParser(prog='actiond', description="ACTION TOOLS DAEMON")
+	parser.add_argument('-v', '--verbose', action='store_true', help='Verbose output.')
+	parser.add_argument('-s', '--socket',  type=str, default=None, help='Unix socket path (default ${0} or {1})'.format(SOCKET_ENV, DEFAULT_SOCKET))
+	parser.add_argument('--log-file', type=str, default=None, help='Optional log file')
+	return parser
+
+# ================ #
+# MAIN ENTRY POINT #
+# ================ #
+
+def main():
+	'''
+	Daemon entry point
+	'''
+	options = createParser().parse_args(sys.argv[1:])
+	handler = logging.FileHandler(options.log_file) if options.log_file else logging.StreamHandler()
+	handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s'))
+	log.addHandler(handler)
+	log.setLevel(logging.DEBUG if options.verbose else logging.INFO)
+	path = socket_path(options.socket)
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	if os.path.exists(path):
+		os.unlink(path)
+	warm_up()
+	with CommandServer(path, CommandHandler) as server:
+		# Commands run with the daemon owner credentials, so only the owner may connect
+		os.chmod(path, 0o600)
+		log.info("Serving {0} on {1}".format(", ".join(TOOLS), path))
+		try:
+			server.serve_forever()
+		except KeyboardInterrupt:
+			log.info("Daemon stopped by user")
+		finally:
+			os.unlink(path)
+
+
+if __name__ == '__main__':
+	main()
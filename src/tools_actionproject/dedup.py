@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+# Deduplication of records across runs, keyed on the record id plus a hash of
+# its content, so that an edited record is not taken as a duplicate.
+#
+# Seen keys are kept on disk: a memory mapped Bloom filter answers most
+# lookups of new records without touching the exact set, a SQLite table
+# of 16 byte keys, which is only checked on Bloom filter positives.
+
+#--------------------
+# System wide imports
+# -------------------
+
+import os
+import math
+import mmap
+import json
+import struct
+import sqlite3
+import hashlib
+
+# ----------------
+# Module constants
+# ----------------
+
+DEFAULT_CAPACITY   = 20000000  # Keys expected, sizes the Bloom filter
+DEFAULT_ERROR_RATE = 0.01      # Bloom filter false positive rate at capacity
+
+BLOOM_MAGIC  = b'ACTBLM01'
+BLOOM_HEADER = struct.Struct('<8sQQ')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS seen_t
+(
+	key BLOB PRIMARY KEY
+) WITHOUT ROWID;
+'''
+
+# -------
+# Classes
+# -------
+
+class BloomFilter:
+	'''Bloom filter whose bit array lives in a memory mapped file'''
+
+	def __init__(self, path, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+		self.created = not os.path.exists(path)
+		if self.created:
+			bits = int(math.ceil(-capacity * math.log(error_rate) / math.log(2)**2))
+			hashes = max(1, round(bits / capacity * math.log(2)))
+			with open(path, 'wb') as fd:
+				fd.write(BLOOM_HEADER.pack(BLOOM_MAGIC, bits, hashes))
+				fd.truncate(BLOOM_HEADER.size + (bits + 7) // 8)	# sparse file
+		with open(path, 'r+b') as fd:
+			self.map = mmap.mmap(fd.fileno(), 0)
+		magic, self.bits, self.hashes = BLOOM_HEADER.unpack_from(self.map, 0)
+		if magic != BLOOM_MAGIC:
+			self.map.close()
+			raise ValueError("{0} is not a Bloom filter file".format(path))
+
+	def positions(self, key):
+		'''Bit positions of a key, by double hashing of a 16 byte key'''
+		h1 = int.from_bytes(key[:8], 'little')
+		h2 = int.from_bytes(key[8:16], 'little') | 1
+		return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+	def add(self, key):
+		for position in self.positions(key):
+			index = BLOOM_HEADER.size + position // 8
+			self.map[index] = self.map[index] | (1 << (position % 8))
+
+	def __contains__(self, key):
+		return all(self.map[BLOOM_HEADER.size + position // 8] & (1 << (position % 8)) for position in self.positions(key))
+
+	def close(self):
+		self.map.flush()
+		self.map.close()
+
+
+class SeenSet:
+	'''On disk set of seen record keys: a Bloom filter backed by an exact SQLite set'''
+
+	def __init__(self, directory, name, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+		os.makedirs(directory, exist_ok=True)
+		self.bloom = BloomFilter(os.path.join(directory, name + '.bloom'), capacity, error_rate)
+		self.conn  = sqlite3.connect(os.path.join(directory, name + '.db'))
+		self.conn.executescript(SCHEMA)
+		self.duplicates = 0
+		if self.bloom.created:
+			# Bloom filter lost or never built for an existing set
+			for key, in self.conn.execute("SELECT key FROM seen_t"):
+				self.bloom.add(key)
+
+	def __contains__(self, key):
+		if key not in self.bloom:
+			return False
+		return self.conn.execute("SELECT 1 FROM seen_t WHERE key = ?", (key,)).fetchone() is not None
+
+	def add(self, key):
+		'''Adds a key. Returns True if it was not already in the set'''
+		if key in self:
+			self.duplicates += 1
+			return False
+		self.bloom.add(key)
+		self.conn.execute("INSERT INTO seen_t (key) VALUES (?)", (key,))
+		return True
+
+	def update(self, keys):
+		'''Adds keys of records already processed and commits them'''
+		for key in keys:
+			self.add(key)
+		self.conn.commit()
+
+	def commit(self):
+		self.conn.commit()
+
+	def close(self):
+		self.conn.commit()
+		self.conn.close()
+		self.bloom.close()
+
+# ---------
+# Interface
+# ---------
+
+def record_key(record, id_key, ignore=()):
+	'''16 byte key made of the record id and a hash of its content, ignoring some volatile fields'''
+	content = {name: value for name, value in record.items() if name not in ignore}
+	digest = hashlib.blake2b(digest_size=16)
+	digest.update(str(record[id_key]).encode('utf-8'))
+	digest.update(b'\0')
+	digest.update(json.dumps(content, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+	return digest.digest()
+
+
+def content_hash(record, ignore=()):
+	'''16 byte hash of the record contents, ignoring some volatile fields'''
+	content = {name: value for name, value in record.items() if name not in ignore}
+	return hashlib.blake2b(json.dumps(content, sort_keys=True, separators=(',', ':')).encode('utf-8'), digest_size=16).digest()
+
+
+def unique(records, seen, id_key, ignore=()):
+	'''Passes through the records not seen before, as (key, record) pairs.
+	Keys are not added to the seen set, callers do so once the records are safely processed'''
+	keys = set()
+	for record in records:
+		key = record_key(record, id_key, ignore)
+		if key in keys or key in seen:
+			seen.duplicates += 1
+			continue
+		keys.add(key)
+		yield key, record
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+# Optional on-disk cache for GET responses, so that re-runs over historical
+# pages are served locally. Responses are kept in a SQLite database keyed by
+# the full request URL (query parameters included), expire after a TTL and
+# are evicted in least recently used order when the cache grows too big.
+
+#--------------------
+# System wide imports
+# -------------------
+
+import os
+import time
+import json
+import sqlite3
+import logging
+import threading
+
+import requests
+
+#--------------
+# local imports
+# -------------
+
+from . import DEFAULT_HTTP_CACHE_TTL, DEFAULT_HTTP_CACHE_SIZE
+
+# ----------------
+# Module constants
+# ----------------
+
+CACHE_FILE   = 'http-cache.db'
+EVICT_BATCH  = 100  # Least recently used responses read at a time when evicting
+
+# Body is stored already decoded
+SKIP_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS response_t
+(
+	url          TEXT PRIMARY KEY,
+	status       INTEGER,
+	headers      TEXT,
+	body         BLOB,
+	size         INTEGER,
+	created_at   REAL,
+	accessed_at  REAL
+);
+CREATE INDEX IF NOT EXISTS response_accessed_i ON response_t(accessed_at);
+CREATE INDEX IF NOT EXISTS response_created_i ON response_t(created_at);
+'''
+
+# -----------------------
+# Module global variables
+# -----------------------
+
+log = logging.getLogger("httpcache")
+
+# -------
+# Classes
+# -------
+
+class HTTPCache:
+	'''Thread safe SQLite store of GET responses with TTL and size based LRU eviction'''
+
+	def __init__(self, directory, ttl=DEFAULT_HTTP_CACHE_TTL, max_size=DEFAULT_HTTP_CACHE_SIZE):
+		os.makedirs(directory, exist_ok=True)
+		path = os.path.join(directory, CACHE_FILE)
+		if not os.path.exists(path):
+			os.close(os.open(path, os.O_WRONLY | os.O_CREAT, 0o600))	# may contain private data
+		self.ttl      = ttl
+		self.max_size = max_size * 1024 * 1024
+		self.lock     = threading.Lock()
+		self.conn     = sqlite3.connect(path, check_same_thread=False)
+		self.conn.executescript(SCHEMA)
+		# Total size is only summed once, then kept up to date by put() and evict()
+		self.size,    = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM response_t').fetchone()
+		self.hits     = 0
+		self.misses   = 0
+
+	def get(self, url):
+		'''Returns the cached response for url, or None if missing or expired'''
+		now = time.time()
+		with self.lock, self.conn:
+			row = self.conn.execute('SELECT status, headers, body FROM response_t WHERE url = ? AND created_at > ?',
+				(url, now - self.ttl)).fetchone()
+			if row is None:
+				return None
+			self.conn.execute('UPDATE response_t SET accessed_at = ? WHERE url = ?', (now, url))
+			self.hits += 1
+		status, headers, body = row
+		response = requests.Response()
+		response.status_code = status
+		response.headers     = requests.structures.CaseInsensitiveDict(json.loads(headers))
+		response.encoding    = requests.utils.get_encoding_from_headers(response.headers)
+		response._content    = body
+		response.url         = url
+		response.request     = requests.Request('GET', url).prepare()
+		return response
+
+	def put(self, url, response):
+		'''Stores a successful response to url, evicting the least recently used ones if needed'''
+		self.misses += 1
+		if response.status_code != 200:
+			return
+		now = time.time()
+		headers = {key: value for key, value in response.headers.items() if key.lower() not in SKIP_HEADERS}
+		body = response.content
+		with self.lock, self.conn:
+			previous = self.conn.execute('SELECT size FROM response_t WHERE url = ?', (url,)).fetchone()
+			self.conn.execute('INSERT OR REPLACE INTO response_t VALUES (?, ?, ?, ?, ?, ?, ?)',
+				(url, response.status_code, json.dumps(headers), body, len(body), now, now))
+			self.size += len(body) - (previous[0] if previous is not None else 0)
+			self.evict(now)
+
+	def evict(self, now):
+		'''Deletes the expired responses, then the least recently used ones while over the size limit'''
+		expired, = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM response_t WHERE created_at <= ?', (now - self.ttl,)).fetchone()
+		if expired:
+			self.conn.execute('DELETE FROM response_t WHERE created_at <= ?', (now - self.ttl,))
+			self.size -= expired
+		while self.size > self.max_size:
+			rows = self.conn.execute('SELECT url, size FROM response_t ORDER BY accessed_at LIMIT ?', (EVICT_BATCH,)).fetchall()
+			if not rows:
+				self.size = 0
+				break
+			for url, size in rows:
+				if self.size <= self.max_size:
+					break
+				self.conn.execute('DELETE FROM response_t WHERE url = ?', (url,))
+				self.size -= size
+				log.debug("Evicted {0} from HTTP cache".format(url))
+
+	def close(self):
+		log.info("HTTP cache: {0} hits, {1} misses".format(self.hits, self.misses))
+		self.conn.close()
+
+
+class CachedSession(requests.Session):
+	'''requests session serving GET requests from an HTTPCache'''
+
+	def __init__(self, cache):
+		super().__init__()
+		self.cache = cache
+
+	def lookup(self, method, url, params=None):
+		'''Cached response for a request, if any. Only GET requests are cached'''
+		if method.upper() != 'GET':
+			return None
+		return self.cache.get(cache_key(url, params))
+
+	def request(self, method, url, **kwargs):
+		response = self.lookup(method, url, kwargs.get('params'))
+		if response is not None:
+			return response
+		response = super().request(method, url, **kwargs)
+		if method.upper() == 'GET':
+			self.cache.put(cache_key(url, kwargs.get('params')), response)
+		return response
+
+	def close(self):
+		super().close()
+		self.cache.close()
+
+# ------------------
+# Auxiliar functions
+# ------------------
+
+def cache_key(url, params):
+	'''Full request URL, with the query parameters encoded as requests does'''
+	return requests.Request('GET', url, params=params).prepare().url
+
+# ---------
+# Interface
+# ---------
+
+def session(options):
+	'''Returns a new requests session, cached if the --http-cache option was given'''
+	if getattr(options, 'http_cache', None) is None:
+		return requests.Session()
+	log.info("Using HTTP cache in {0}".format(options.http_cache))
+	return CachedSession(HTTPCache(options.http_cache, options.http_cache_ttl, options.http_cache_size))
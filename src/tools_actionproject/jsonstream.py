@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+# Streaming reader of the JSON exports shared by the tools, so that
+# files larger than memory can be processed record by record.
+
+#--------------------
+# System wide imports
+# -------------------
+
+import json
+
+# ----------------
+# Module constants
+# ----------------
+
+CHUNK_SIZE = 64*1024 # Bytes read at a time by the streaming JSON reader
+NUMBER_CHARS = '0123456789.eE+-' # Characters that may continue a JSON number
+
+# ------------------
+# Auxiliar functions
+# ------------------
+
+def iter_json_array(fd, key=None, chunk_size=CHUNK_SIZE):
+	'''Lazily yields the items of the array under a top level JSON object key,
+	or of a top level array if key is None, reading the file in chunks so that
+	memory does not grow with the file size'''
+	decoder = json.JSONDecoder()
+	buf = ''
+	pos = 0
+
+	def more():
+		nonlocal buf, pos
+		data = fd.read(chunk_size)
+		buf = buf[pos:] + data
+		pos = 0
+		return len(data) > 0
+
+	def next_char():
+		nonlocal pos
+		while True:
+			while pos < len(buf) and buf[pos].isspace():
+				pos += 1
+			if pos < len(buf):
+				return buf[pos]
+			if not more():
+				raise ValueError("Unexpected end of JSON file")
+
+	def expect(chars):
+		nonlocal pos
+		char = next_char()
+		if char not in chars:
+			raise ValueError("Expected one of {0!r} in JSON file, got {1!r}".format(chars, char))
+		pos += 1
+		return char
+
+	def value():
+		nonlocal pos
+		next_char()
+		while True:
+			try:
+				result, end = decoder.raw_decode(buf, pos)
+			except json.JSONDecodeError:
+				if not more():
+					raise
+				continue
+			# A number may be split across chunks, i.e. after its '.' or 'e',
+			# so it needs a delimiter after it
+			if isinstance(result, (int, float)) and (end == len(buf) or buf[end] in NUMBER_CHARS) and more():
+				continue
+			pos = end
+			return result
+
+	def items():
+		expect('[')
+		if next_char() == ']':
+			return
+		while True:
+			yield value()
+			if expect(',]') == ']':
+				return
+
+	if key is None:
+		yield from items()
+		return
+	expect('{')
+	if next_char() == '}':
+		raise KeyError(key)
+	while True:
+		name = value()
+		expect(':')
+		if name != key:
+			value()
+		else:
+			yield from items()
+			return
+		if expect(',}') == '}':
+			raise KeyError(key)
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+# Token bucket rate limiters shared by every API client, with per host policies.
+#
+# Buckets reserve tokens ahead of time: acquiring a token never holds a lock
+# while waiting, it just books the next free slot and sleeps until then.
+# By default, buckets keep their state in a file locked with fcntl, so that
+# all the processes in the same machine (i.e. parallel Airflow tasks) share
+# the same budget instead of each one throttling on its own.
+#
+# Policies may be overriden with the environment variables
+#   ACTIONPROJECT_RATE_LIMITS = "<host>=<rate>[:<burst>],..." (rate in requests/second)
+#   ACTIONPROJECT_RATE_DIR    = <directory where shared bucket state files live>
+
+#--------------------
+# System wide imports
+# -------------------
+
+import os
+import time
+import json
+import fcntl
+import logging
+import threading
+import urllib.parse
+
+# ----------------
+# Module constants
+# ----------------
+
+LIMITS_ENV = 'ACTIONPROJECT_RATE_LIMITS'
+DIR_ENV    = 'ACTIONPROJECT_RATE_DIR'
+
+DEFAULT_RATE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'tools-actionproject', 'ratelimit')
+
+# Default (rate, burst) policies per host
+POLICIES = {
+	'five.epicollect.net'  : (1.0, 1),	# Epicollect V allows 1 TPS
+	'api.actionproject.eu' : (1.0, 1),
+}
+
+# -----------------------
+# Module global variables
+# -----------------------
+
+log = logging.getLogger("ratelimit")
+
+_registry = dict()
+_registry_lock = threading.Lock()
+_state_dir = None
+_state_dir_set = False	# Until set_state_dir() is called, the directory is read from the environment
+
+# -------
+# Classes
+# -------
+
+class TokenBucket:
+	'''Thread safe token bucket with a given rate (tokens/second) and burst size'''
+
+	def __init__(self, rate, burst=1):
+		self.rate   = rate
+		self.burst  = burst
+		self.tokens = burst
+		self.stamp  = None
+		self.lock   = threading.Lock()
+
+	def _take(self, tokens, stamp, now):
+		'''Refills and takes one token from the given state. Returns the new state and the wait'''
+		if stamp is not None:
+			tokens = min(self.burst, tokens + max(0.0, now - stamp) * self.rate)
+		tokens -= 1
+		wait = -tokens / self.rate if tokens < 0 else 0.0
+		return tokens, now, wait
+
+	def reserve(self):
+		'''Books a token and returns the seconds to wait before using it'''
+		if self.rate is None:
+			return 0.0
+		with self.lock:
+			self.tokens, self.stamp, wait = self._take(self.tokens, self.stamp, time.monotonic())
+		return wait
+
+	def acquire(self):
+		'''Blocks until a token is available'''
+		wait = self.reserve()
+		if wait > 0:
+			time.sleep(wait)
+
+
+class FileTokenBucket(TokenBucket):
+	'''Token bucket whose state is kept in a file locked with fcntl, shared by several processes'''
+
+	def __init__(self, rate, burst, path):
+		super().__init__(rate, burst)
+		self.path = path
+
+	def reserve(self):
+		if self.rate is None:
+			return 0.0
+		with self.lock, open(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600), 'r+') as fd:
+			fcntl.flock(fd, fcntl.LOCK_EX)
+			try:
+				state = json.loads(fd.read() or '{}')
+				tokens, stamp = state.get('tokens', self.burst), state.get('stamp')
+				tokens, stamp, wait = self._take(tokens, stamp, time.time())
+				fd.seek(0)
+				fd.truncate()
+				fd.write(json.dumps({'tokens': tokens, 'stamp': stamp}))
+				fd.flush()
+			finally:
+				fcntl.flock(fd, fcntl.LOCK_UN)
+		return wait
+
+# ------------------
+# Auxiliar functions
+# ------------------
+
+def policies():
+	'''Default policies updated with the ones given in the environment'''
+	result = dict(POLICIES)
+	for item in filter(None, os.environ.get(LIMITS_ENV, '').split(',')):
+		host, _, policy = item.strip().partition('=')
+		rate, _, burst = policy.partition(':')
+		result[host] = (float(rate), int(burst or 1))
+	return result
+
+
+def host_of(url):
+	return urllib.parse.urlsplit(url).hostname or url
+
+
+def state_dir():
+	'''Directory of the shared bucket state files. None keeps the state private to this process.
+	The environment is read at call time, as commands forked by the daemon get the caller environment'''
+	return _state_dir if _state_dir_set else os.environ.get(DIR_ENV, DEFAULT_RATE_DIR)
+
+
+def make_bucket(host, rate, burst):
+	directory = state_dir()
+	if directory is None:
+		return TokenBucket(rate, burst)
+	os.makedirs(directory, exist_ok=True)
+	return FileTokenBucket(rate, burst, os.path.join(directory, host + '.bucket'))
+
+# ---------
+# Interface
+# ---------
+
+def configure(url, rate=None, burst=None):
+	'''Overrides the policy of the host of url, i.e. from a command line option.
+	Returns the host rate limiter'''
+	host = host_of(url)
+	default_rate, default_burst = policies().get(host, (None, 1))
+	rate  = default_rate if rate is None else rate
+	burst = default_burst if burst is None else burst
+	bucket = make_bucket(host, rate, burst)
+	log.debug("Rate limit for {0} is {1} TPS, burst {2}".format(host, rate, burst))
+	with _registry_lock:
+		_registry[host] = bucket
+	return bucket
+
+
+def set_state_dir(path):
+	'''Shares the rate limiters state with other processes through files in path.
+	A None path keeps the state private to this process'''
+	global _state_dir, _state_dir_set
+	with _registry_lock:
+		_state_dir, _state_dir_set = path, True
+		for host, bucket in _registry.items():
+			_registry[host] = make_bucket(host, bucket.rate, bucket.burst)
+
+
+def limiter(url):
+	'''Returns the rate limiter shared by all requests to the host of url.
+	Hosts without policy get an unlimited bucket'''
+	host = host_of(url)
+	with _registry_lock:
+		if host not in _registry:
+			rate, burst = policies().get(host, (None, 1))
+			_registry[host] = make_bucket(host, rate, burst)
+		return _registry[host]
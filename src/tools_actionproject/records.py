@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+# Compact record file with random access by position or by id, read through mmap.
+#
+# Layout (little endian):
+#   header   magic, record count, offsets position, hash table position, hash table size, key name
+#   records  one compact JSON document per record
+#   offsets  (position, length) of each record, in writing order
+#   table    open addressing hash table of (id hash, record number + 1) slots
+#
+# Opening a file only reads its header, so lookups never parse the whole file.
+
+#--------------------
+# System wide imports
+# -------------------
+
+import os
+import mmap
+import json
+import struct
+import hashlib
+import logging
+
+# ----------------
+# Module constants
+# ----------------
+
+MAGIC  = b'ACTREC01'
+HEADER = struct.Struct('<8sQQQQ32s')
+OFFSET = struct.Struct('<QQ')
+SLOT   = struct.Struct('<QQ')
+
+# -----------------------
+# Module global variables
+# -----------------------
+
+log = logging.getLogger("records")
+
+# ------------------
+# Auxiliar functions
+# ------------------
+
+def id_hash(record_id):
+	return int.from_bytes(hashlib.blake2b(str(record_id).encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def table_size(count):
+	'''Power of two hash table size keeping the load factor under 1/2'''
+	size = 1
+	while size < 2 * count:
+		size *= 2
+	return size
+
+# -------
+# Classes
+# -------
+
+class RecordWriter:
+	'''Writes records to a new record file. Use it as a context manager'''
+
+	def __init__(self, path, key='id'):
+		self.path    = path
+		self.key     = key
+		self.fd      = open(path, 'wb')
+		self.offsets = list()
+		self.hashes  = list()
+		self.fd.write(HEADER.pack(MAGIC, 0, 0, 0, 0, key.encode('utf-8')))
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		if exc_type is None:
+			self.close()
+		else:
+			self.fd.close()
+			os.remove(self.path)	# Never leave a file without index behind
+
+	def write(self, record):
+		data = json.dumps(record, separators=(',', ':')).encode('utf-8')
+		self.offsets.append((self.fd.tell(), len(data)))
+		self.hashes.append(id_hash(record[self.key]))
+		self.fd.write(data)
+
+	def close(self):
+		if self.fd.closed:
+			return
+		offsets_position = self.fd.tell()
+		for offset in self.offsets:
+			self.fd.write(OFFSET.pack(*offset))
+		size = table_size(len(self.hashes))
+		table = [(0, 0)] * size
+		for number, value in enumerate(self.hashes):
+			slot = value & (size - 1)
+			while table[slot][1]:
+				slot = (slot + 1) & (size - 1)
+			table[slot] = (value, number + 1)
+		table_position = self.fd.tell()
+		for slot in table:
+			self.fd.write(SLOT.pack(*slot))
+		self.fd.seek(0)
+		self.fd.write(HEADER.pack(MAGIC, len(self.offsets), offsets_position, table_position, size, self.key.encode('utf-8')))
+		self.fd.close()
+		log.info("Written {0} records to {1}".format(len(self.offsets), self.path))
+
+
+class RecordFile:
+	'''Read only, memory mapped record file. Records are decoded only when accessed,
+	by position (integer or slice) or by id. Use it as a context manager'''
+
+	def __init__(self, path):
+		with open(path, 'rb') as fd:
+			self.map = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+		magic, self.count, self.offsets, self.table, self.size, key = HEADER.unpack_from(self.map, 0)
+		if magic != MAGIC:
+			self.map.close()
+			raise ValueError("{0} is not a record file".format(path))
+		self.key = key.rstrip(b'\0').decode('utf-8')
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		self.close()
+
+	def __len__(self):
+		return self.count
+
+	def __iter__(self):
+		return (self.record(number) for number in range(self.count))
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return [self.record(number) for number in range(*index.indices(self.count))]
+		if index < 0:
+			index += self.count
+		if not 0 <= index < self.count:
+			raise IndexError("record index out of range")
+		return self.record(index)
+
+	def __contains__(self, record_id):
+		return self.get(record_id) is not None
+
+	def record(self, number):
+		position, length = OFFSET.unpack_from(self.map, self.offsets + number * OFFSET.size)
+		return json.loads(self.map[position:position + length])
+
+	def get(self, record_id, default=None):
+		'''Returns the record with the given id, probing the hash table'''
+		value = id_hash(record_id)
+		slot = value & (self.size - 1)
+		while True:
+			stored, number = SLOT.unpack_from(self.map, self.table + slot * SLOT.size)
+			if not number:
+				return default
+			if stored == value:
+				record = self.record(number - 1)
+				if str(record[self.key]) == str(record_id):
+					return record
+			slot = (slot + 1) & (self.size - 1)
+
+	def close(self):
+		self.map.close()
+
+# ---------
+# Interface
+# ---------
+
+def write_records(path, records, key='id'):
+	'''Writes an iterable of records to a record file. Returns the number of records written'''
+	with RecordWriter(path, key) as writer:
+		for record in records:
+			writer.write(record)
+	return len(writer.offsets)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+# Retry engine shared by the API clients. A transient failure (throttling,
+# server errors, connection errors) only retries the failed request, i.e.
+# a single page or record, with exponential backoff and jitter, honoring
+# the server Retry-After header.
+#
+# Non idempotent requests (POST) are only retried when the server surely did
+# not process them (connection never established, throttled), so that a
+# record is never stored twice.
+
+#--------------------
+# System wide imports
+# -------------------
+
+import time
+import random
+import logging
+import datetime
+import email.utils
+
+import requests
+
+#--------------
+# local imports
+# -------------
+
+from . import ratelimit
+
+# ----------------
+# Module constants
+# ----------------
+
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 1.0   # Initial retry delay in seconds, doubled on each retry
+MAX_DELAY       = 300   # Longest wait between retries, in seconds
+DEFAULT_TIMEOUT = (10, 60)  # Connect and read timeouts in seconds
+RETRY_STATUS    = (429, 500, 502, 503, 504)
+IDEMPOTENT      = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+# -----------------------
+# Module global variables
+# -----------------------
+
+log = logging.getLogger("retry")
+
+# ------------------
+# Auxiliar functions
+# ------------------
+
+def backoff(attempt):
+	'''Exponential backoff with jitter for the given (zero based) attempt'''
+	return min(MAX_DELAY, DEFAULT_BACKOFF * 2**attempt * (0.5 + random.random()))
+
+
+def retry_after(headers, default):
+	'''Delay requested by the server in a Retry-After header, either in seconds or as an HTTP date'''
+	value = headers.get('Retry-After', '').strip()
+	if value.isdigit():
+		return min(MAX_DELAY, float(value))
+	try:
+		date = email.utils.parsedate_to_datetime(value)
+	except (TypeError, ValueError):
+		return default
+	delay = (date - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+	return min(MAX_DELAY, max(0.0, delay))
+
+
+def retry_status(method, status):
+	'''Whether a response status is worth retrying. A throttled request was not processed, so it is always retried'''
+	return status in RETRY_STATUS if method.upper() in IDEMPOTENT else status == 429
+
+# ---------
+# Interface
+# ---------
+
+def request(session, method, url, limiter=None, retries=DEFAULT_RETRIES, **kwargs):
+	'''Performs a rate limited request with a requests session, retrying transient failures.
+	Returns the successful response or raises the last error'''
+	# Responses served by an HTTP cache session skip rate limiting
+	lookup = getattr(session, 'lookup', None)
+	response = lookup(method, url, kwargs.get('params')) if lookup is not None else None
+	if response is not None:
+		return response
+	limiter = limiter or ratelimit.limiter(url)
+	kwargs.setdefault('timeout', DEFAULT_TIMEOUT)	# A stalled connection would hang forever
+	for attempt in range(retries + 1):
+		delay = backoff(attempt)
+		limiter.acquire()
+		try:
+			response = session.request(method, url, **kwargs)
+		except (requests.ConnectionError, requests.Timeout) as e:
+			# Only a connect timeout guarantees that a non idempotent request was never sent
+			if attempt == retries or not (method.upper() in IDEMPOTENT or isinstance(e, requests.ConnectTimeout)):
+				raise
+			log.warning("{0} {1} => {2}. Retrying in {3:.1f} s".format(method, url, e, delay))
+		else:
+			if not retry_status(method, response.status_code) or attempt == retries:
+				response.raise_for_status()
+				return response
+			delay = retry_after(response.headers, delay)
+			log.warning("{0} {1} => HTTP {2}. Retrying in {3:.1f} s".format(method, url, response.status_code, delay))
+		time.sleep(delay)
@@ -10,6 +10,8 @@
 # System wide imports
 # -------------------
 
+import os.path
+
 # ---------------
 # Airflow imports
 # ---------------
@@ -18,7 +20,7 @@
 # local imports
 # -------------
 
-from tools_actionproject._version import get_versions
+from tools_actionproject.cli import lazy_version
 
 
 # -----------------------
@@ -33,7 +35,11 @@ from tools_actionproject._version import get_versions
 
 DEFAULT_TIMEOUT = 20*60 # Twenty minutes
 DEFAULT_LANGUAGE = 'en'
+DEFAULT_PAGE_SIZE = 100 # Maximum page size allowed by the Panoptes API
+DEFAULT_WORKERS   = 4   # Concurrent Panoptes API requests
+DEFAULT_RETRIES   = 3   # Retries when saving a subject
+DEFAULT_MAX_AGE   = 3600 # Seconds before the local inventory is refreshed from Zooniverse
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'zoonispectra') # Tokens & projects cache
 
-__version__ = get_versions()['version']
 
-del get_versions
+__getattr__ = lazy_version(__name__)
@@ -22,7 +22,8 @@ import importlib
 # Local imports
 # -------------
 
-from . import  __version__, DEFAULT_TIMEOUT, DEFAULT_LANGUAGE
+from tools_actionproject.cli import version, VersionAction
+from . import  DEFAULT_TIMEOUT, DEFAULT_LANGUAGE, DEFAULT_PAGE_SIZE, DEFAULT_WORKERS, DEFAULT_RETRIES, DEFAULT_MAX_AGE, DEFAULT_CACHE_DIR
 
 # -----------------------
 # Module global variables
@@ -30,6 +31,17 @@ from . import  __version__, DEFAULT_TIMEOUT, DEFAULT_LANGUAGE
 
 log = logging.getLogger("zoonis")
 
+# ----------------
+# Module constants
+# ----------------
+
+# Command modules, imported only when their command is run
+COMMAND_MODULES = {
+	'project'   : 'project',
+	'subjectset': 'subjectsets',
+	'workflow'  : 'workflow',
+}
+
 # -----------------------
 # Module global functions
 # -----------------------
@@ -80,12 +92,15 @@ def createParser():
 	parser    = argparse.ArgumentParser(prog=name, description="ZOONIVERSE TOOL")
 
 	# Global options
-	parser.add_argument('--version', action='version', version='{0} {1}'.format(name, __version__))
+	parser.add_argument('--version', action=VersionAction)
 	group = parser.add_mutually_exclusive_group()
 	group.add_argument('-v', '--verbose', action='store_true', help='Verbose output.')
 	group.add_argument('-q', '--quiet',   action='store_true', help='Quiet output.')
 	parser.add_argument('-nk','--no-console', action='store_true', help='Do not log to console.')
 	parser.add_argument('--log-file', type=str, default=None, help='Optional log file')
+	group = parser.add_mutually_exclusive_group()
+	group.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR, help='Directory caching Zooniverse tokens & projects between invocations')
+	group.add_argument('--no-cache',  dest='cache_dir', action='store_const', const=None, help='Do not cache Zooniverse tokens & projects')
 
 	
 	# --------------------------
@@ -106,6 +121,9 @@ def createParser():
 	parser_find.add_argument('-u','--username',  type=str, required=True, help='Zooniverse username')
 	parser_find.add_argument('-pw','--password', type=str, required=True, help='Zooniverse password')
 	parser_find.add_argument('-p','--project',   type=str, required=True, help='Zooniverse Project slug')
+	parser_find.add_argument('-i','--inventory', type=str, default=None, help='Optional SQLite file caching the project inventory')
+	parser_find.add_argument('--max-age',        type=int, default=DEFAULT_MAX_AGE, help='Max. inventory age in seconds before refreshing it')
+	parser_find.add_argument('--refresh',        action='store_true', help='Force inventory refresh')
 	
 	parser_create = subparser.add_parser('create', help='Create a new project')
 	parser_create.add_argument('-u','--username',    type=str, required=True, help='Zooniverse username')
@@ -130,6 +148,14 @@ def createParser():
 	parser_classi.add_argument('-pw','--password', type=str, required=True, help='Zooniverse password')
 	parser_classi.add_argument('-p','--project',   type=str, required=True, help='Zooniverse Project slug')
 	parser_classi.add_argument('-f','--file',      type=str, required=True, help='Output file where to save export as JSON lines')
+	parser_classi.add_argument('--last-id',        type=str, default=None, help='Only classifications newer than this classification id')
+
+	parser_aggr = subparser.add_parser('aggregate', help='Aggregate exported classifications votes per subject (faster with pandas)')
+	parser_aggr.add_argument('-i','--input-file',  type=str, required=True, help='Input JSON file written by project export or project classifications')
+	parser_aggr.add_argument('-o','--output-file', type=str, required=True, help='Output JSON file with one row per subject')
+	parser_aggr.add_argument('-w','--workflow',    type=str, default=None, help='Only aggregate classifications of this workflow id')
+	parser_aggr.add_argument('-s','--state-file',  type=str, default=None, help='Optional SQLite file keeping vote counts between runs, so that only new classifications are added')
+	parser_aggr.add_argument('-c','--changed',     action='store_true', help='With --state-file, only output the subjects updated by this run')
 	
 	# -----------------
 	# Workflow Commands
@@ -150,12 +176,19 @@ def createParser():
 	parser_wkflstat.add_argument('-pw','--password',  type=str, required=True, help='Zooniverse password')
 	parser_wkflstat.add_argument('-p','--project',   type=str, required=True, help='Zooniverse Project slug')
 	parser_wkflstat.add_argument('-f','--file',      type=str, required=True, help='Output file where to save workflow status as JSON lines')
+	parser_wkflstat.add_argument('-ps','--page-size', type=int, default=DEFAULT_PAGE_SIZE, help='Page size for bulk Panoptes API requests')
+	parser_wkflstat.add_argument('-w','--workers',    type=int, default=DEFAULT_WORKERS, help='Max. number of concurrent Panoptes API requests')
+	parser_wkflstat.add_argument('-i','--inventory', type=str, default=None, help='Optional SQLite inventory where retired subjects are tracked between runs')
+	parser_wkflstat.add_argument('--full', action='store_true', help='Ignore tracked retired subjects and query all of them again')
 
 	parser_subjsets = subparser.add_parser('subjectsets', help='List Active Subject Sets for each Workflow')
 	parser_subjsets.add_argument('-u','--username',  type=str, required=True, help='Zooniverse username')
 	parser_subjsets.add_argument('-pw','--password', type=str, required=True, help='Zooniverse password')
 	parser_subjsets.add_argument('-p','--project',   type=str, required=True, help='Zooniverse Project slug')
 	parser_subjsets.add_argument('-f','--file',      type=str, required=True, help='Output file where to list subject sets as JSON lines')
+	parser_subjsets.add_argument('-i','--inventory', type=str, default=None, help='Optional SQLite file caching the project inventory')
+	parser_subjsets.add_argument('--max-age',        type=int, default=DEFAULT_MAX_AGE, help='Max. inventory age in seconds before refreshing it')
+	parser_subjsets.add_argument('--refresh',        action='store_true', help='Force inventory refresh')
 
 	# -----------------------
 	#  SubjectSet Subcommands
@@ -169,11 +202,22 @@ def createParser():
 	parser_create.add_argument('-pw','--password', type=str, required=True, help='Zooniverse password')
 	parser_create.add_argument('-p','--project',   type=str, required=True, help='Zooniverse Project slug')
 	parser_create.add_argument('-f','--file',      type=str, required=True, help='Input JSON file with images & metadata to upload')
+	parser_create.add_argument('-w','--workers',    type=int, default=DEFAULT_WORKERS, help='Max. number of concurrent subject uploads')
+	parser_create.add_argument('-r','--retries',    type=int, default=DEFAULT_RETRIES, help='Retries per subject upload')
+	parser_create.add_argument('-b','--batch-size', type=int, default=DEFAULT_PAGE_SIZE, help='Subjects added to the Subject Set per request')
+	parser_create.add_argument('-j','--journal',    type=str, default=None, help='Optional journal file recording each saved subject')
+	parser_create.add_argument('--resume', action='store_true', help='Resume a failed Subject Set creation from its journal file')
+	parser_create.add_argument('--force', action='store_true', help='Start a new Subject Set, overwriting an existing journal file')
+	parser_create.add_argument('--probe', action='store_true', help='Skip items whose image URL does not answer a HEAD request with an image')
+	parser_create.add_argument('--probe-cache', type=str, default=None, help='Optional JSON file caching image probe results between runs (implies --probe)')
 
 	parser_sslog = subparser.add_parser('show', help='List Subject Sets for a given Project')
 	parser_sslog.add_argument('-u','--username',  type=str, required=True, help='Zooniverse username')
 	parser_sslog.add_argument('-pw','--password', type=str, required=True, help='Zooniverse password')
 	parser_sslog.add_argument('-p','--project',   type=str, required=True, help='Zooniverse Project slug')
+	parser_sslog.add_argument('-i','--inventory', type=str, default=None, help='Optional SQLite file caching the project inventory')
+	parser_sslog.add_argument('--max-age',        type=int, default=DEFAULT_MAX_AGE, help='Max. inventory age in seconds before refreshing it')
+	parser_sslog.add_argument('--refresh',        action='store_true', help='Force inventory refresh')
 
 	return parser
 
@@ -190,14 +234,14 @@ def main():
 		configureLogging(options)
 		setup(options)
 		name = os.path.split(os.path.dirname(sys.argv[0]))[-1]
-		command  = f"{options.command}"
+		command  = f"{COMMAND_MODULES[options.command]}"
 		subcommand = options.subcommand
 		try:
 			command = importlib.import_module(command, package=name)
 		except ModuleNotFoundError:	# when debugging module in git source tree ...
-			command  = f".{options.command}"
+			command  = f".{COMMAND_MODULES[options.command]}"
 			command = importlib.import_module(command, package=name)
-		log.info(f"============== {name} {__version__} ==============")
+		log.info(f"============== {name} {version()} ==============")
 		getattr(command, subcommand)(options)
 	except KeyboardInterrupt as e:
 		log.critical("[%s] Interrupted by user ", __name__)
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+# Aggregation of classification votes per workflow subject and task.
+# A subject in several workflows gets one aggregation per workflow, as tasks differ.
+# Votes are counted with pandas if available (pip install pandas),
+# otherwise with plain Python counters.
+#
+# Vote counts may be kept in a SQLite state file, so that each run only
+# adds the classifications newer than the last one processed.
+
+#--------------------
+# System wide imports
+# -------------------
+
+import sqlite3
+import logging
+import collections
+
+try:
+	import pandas
+except ImportError:
+	pandas = None
+
+# ----------------
+# Module constants
+# ----------------
+
+COLUMNS = ('workflow_id', 'subject_id', 'task', 'answer')
+
+STATE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS state_t
+(
+	name            TEXT PRIMARY KEY,  -- last_id, workflow_id
+	value           TEXT
+);
+
+CREATE TABLE IF NOT EXISTS subject_aggregate_t
+(
+	workflow_id     TEXT,
+	subject_id      TEXT,
+	classifications INTEGER,
+	PRIMARY KEY (workflow_id, subject_id)
+);
+
+CREATE TABLE IF NOT EXISTS vote_t
+(
+	workflow_id     TEXT,
+	subject_id      TEXT,
+	task            TEXT,
+	answer          TEXT,
+	votes           INTEGER,
+	PRIMARY KEY (workflow_id, subject_id, task, answer)
+);
+'''
+
+# -----------------------
+# Module global variables
+# -----------------------
+
+log = logging.getLogger("zoonis")
+
+# ------------------
+# Auxiliar functions
+# ------------------
+
+def subject_id(classification):
+	'''Subject of a classification, either from a project export or from the classifications command'''
+	subject_ids = classification.get('subject_ids') or classification.get('subject_id') or ''
+	return str(subject_ids).split(';')[0] or None
+
+
+def answers(value):
+	'''Answers voted in an annotation value. Drawing marks give no votes'''
+	if value is None:
+		return []
+	if isinstance(value, (str, int, float, bool)):
+		return [str(value)]
+	if isinstance(value, dict):
+		return [str(value['choice'])] if 'choice' in value else []
+	return [answer for item in value for answer in answers(item)]
+
+
+def annotation_votes(annotation):
+	'''Yields (task, answer) votes of an annotation, descending into combo tasks'''
+	task, value = annotation.get('task'), annotation.get('value')
+	if isinstance(value, list) and value and all(isinstance(item, dict) and 'task' in item for item in value):
+		for item in value:
+			yield from annotation_votes(item)
+		return
+	if task is None:
+		return
+	for answer in answers(value):
+		yield task, answer
+
+
+def workflow_of(classification):
+	'''Workflow of a classification as text, as it may be a number in project exports'''
+	workflow = classification.get('workflow_id')
+	return None if workflow is None else str(workflow)
+
+
+def votes(classifications, subjects):
+	'''Yields (workflow, subject, task, answer) votes, updating the subjects dictionary
+	of (workflow id, subject id) => number of classifications'''
+	for classification in classifications:
+		subject = subject_id(classification)
+		if subject is None:
+			continue
+		workflow = workflow_of(classification)
+		subjects[(workflow, subject)] = subjects.get((workflow, subject), 0) + 1
+		for annotation in classification.get('annotations') or []:
+			for task, answer in annotation_votes(annotation):
+				yield workflow, subject, task, answer
+
+
+def classification_id(classification):
+	'''Numeric id of a classification, either from a project export or from the classifications command'''
+	return int(classification.get('classification_id') or classification['id'])
+
+
+def count_votes(votes):
+	if pandas is not None:
+		return count_pandas(votes)
+	log.info("pandas not installed, aggregating votes in plain Python")
+	return count_python(votes)
+
+
+def make_rows(subjects, counts):
+	'''One row per workflow subject from the (workflow id, subject id) => number of classifications dictionary
+	and the (workflow, subject, task, answer, votes) counts'''
+	tasks = collections.defaultdict(dict)
+	for workflow, subject, task, answer, count in counts:
+		tasks[(workflow, subject, task)][answer] = count
+	rows = {key: {'subject_id': key[1], 'workflow_id': key[0], 'classifications': number, 'tasks': dict()}
+		for key, number in subjects.items()}
+	for (workflow, subject, task), task_votes in tasks.items():
+		total = sum(task_votes.values())
+		consensus = min(task_votes, key=lambda answer: (-task_votes[answer], answer))	# ties broken by answer
+		rows[(workflow, subject)]['tasks'][task] = {
+			'votes'     : dict(sorted(task_votes.items())),
+			'consensus' : consensus,
+			'agreement' : task_votes[consensus] / total,
+		}
+	return [rows[key] for key in sorted(rows, key=lambda key: (key[0] or '', key[1]))]
+
+
+def by_workflow(classifications, workflow):
+	if workflow is None:
+		return classifications
+	return (c for c in classifications if workflow_of(c) == str(workflow))
+
+
+def open_state(path):
+	conn = sqlite3.connect(path)
+	columns = [column[1] for column in conn.execute("PRAGMA table_info(vote_t)")]
+	if columns and 'workflow_id' not in columns:
+		conn.close()
+		raise ValueError("Aggregation state {0} was built by a previous version, remove it to rebuild it".format(path))
+	conn.executescript(STATE_SCHEMA)
+	return conn
+
+
+def read_state(conn, name, default=None):
+	row = conn.execute("SELECT value FROM state_t WHERE name = ?", (name,)).fetchone()
+	return default if row is None else row[0]
+
+
+def count_python(votes):
+	'''Returns (workflow, subject, task, answer, votes) tuples'''
+	counter = collections.Counter(votes)
+	return [vote + (count,) for vote, count in counter.items()]
+
+
+def count_pandas(votes):
+	'''Same as count_python, grouping with pandas'''
+	frame = pandas.DataFrame.from_records(votes, columns=COLUMNS)
+	counts = frame.groupby(list(COLUMNS), sort=False, dropna=False).size()
+	# Missing workflows are grouped as NaN
+	return [(None if pandas.isna(workflow) else workflow, *vote, int(count)) for (workflow, *vote), count in counts.items()]
+
+# ---------
+# Interface
+# ---------
+
+def aggregate(classifications, workflow_id=None):
+	'''Aggregates classifications, as read from a project export, into one row per workflow subject with
+	the number of votes for each answer of each task, the consensus answer and its agreement fraction'''
+	subjects = dict()
+	counts = count_votes(votes(by_workflow(classifications, workflow_id), subjects))
+	return make_rows(subjects, counts)
+
+
+def update_state(conn, classifications, workflow_id=None):
+	'''Adds to the aggregation state the votes of the classifications newer than the last one processed.
+	Returns the number of new classifications and the set of (workflow id, subject id) updated'''
+	stored_workflow = read_state(conn, 'workflow_id')
+	workflow_id = None if workflow_id is None else str(workflow_id)
+	if read_state(conn, 'last_id') is not None and stored_workflow != workflow_id:
+		raise ValueError("Aggregation state was built for workflow {0}, not {1}".format(stored_workflow, workflow_id))
+	last_id = int(read_state(conn, 'last_id', 0))
+	newest = [last_id]
+	def new(classifications):
+		for classification in classifications:
+			ident = classification_id(classification)
+			if ident > last_id:
+				newest[0] = max(newest[0], ident)
+				yield classification
+	subjects = dict()
+	counts = count_votes(votes(new(by_workflow(classifications, workflow_id)), subjects))
+	# NULL keys never conflict, so a missing workflow is stored as ''
+	with conn:
+		conn.executemany('''
+			INSERT INTO subject_aggregate_t (workflow_id, subject_id, classifications) VALUES (?, ?, ?)
+			ON CONFLICT(workflow_id, subject_id) DO UPDATE SET classifications = classifications + excluded.classifications''',
+			[(workflow or '', subject, number) for (workflow, subject), number in subjects.items()])
+		conn.executemany('''
+			INSERT INTO vote_t (workflow_id, subject_id, task, answer, votes) VALUES (?, ?, ?, ?, ?)
+			ON CONFLICT(workflow_id, subject_id, task, answer) DO UPDATE SET votes = votes + excluded.votes''',
+			[(workflow or '', *vote) for workflow, *vote in counts])
+		conn.executemany("INSERT OR REPLACE INTO state_t (name, value) VALUES (?, ?)",
+			(('last_id', str(newest[0])), ('workflow_id', workflow_id)))
+	return sum(subjects.values()), set(subjects)
+
+
+def state_rows(conn, keys=None):
+	'''Aggregated rows from the state, for all workflow subjects or only the given (workflow id, subject id) ones'''
+	subjects = {(workflow or None, subject): number for workflow, subject, number in
+		conn.execute("SELECT workflow_id, subject_id, classifications FROM subject_aggregate_t")
+		if keys is None or (workflow or None, subject) in keys}
+	counts = [(workflow or None, subject, *vote) for workflow, subject, *vote in
+		conn.execute("SELECT workflow_id, subject_id, task, answer, votes FROM vote_t")
+		if keys is None or (workflow or None, subject) in keys]
+	return make_rows(subjects, counts)
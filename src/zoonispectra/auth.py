@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+#--------------------
+# System wide imports
+# -------------------
+
+import os
+import time
+import json
+import logging
+import datetime
+import contextlib
+
+#----------------------
+# Panoptes Client stuff
+# ---------------------
+
+from panoptes_client import Panoptes, Project
+from panoptes_client.panoptes import PanoptesAPIException
+
+# ----------------
+# Module constants
+# ----------------
+
+TOKENS_FILE     = 'tokens.json'
+PROJECTS_FILE   = 'projects.json'
+PROJECT_MAX_AGE = 10*60 # Seconds a cached project resource is used before finding it again
+
+# -----------------------
+# Module global variables
+# -----------------------
+
+log = logging.getLogger("zoonis")
+
+# ------------------
+# Auxiliar functions
+# ------------------
+
+def load_cache(cache_dir, name):
+	if cache_dir is None:
+		return dict()
+	path = os.path.join(cache_dir, name)
+	if not os.path.exists(path):
+		return dict()
+	try:
+		with open(path) as fd:
+			return json.load(fd)
+	except ValueError:
+		log.warning("Ignoring corrupted cache file {0}".format(path))
+		return dict()
+
+
+def save_cache(cache_dir, name, cache):
+	'''Saves a cache file readable only by its owner, as it may contain credentials'''
+	if cache_dir is None:
+		return
+	os.makedirs(cache_dir, exist_ok=True)
+	path = os.path.join(cache_dir, name)
+	tmp_path = path + '.tmp'
+	with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as fd:
+		json.dump(cache, fp=fd)
+	os.replace(tmp_path, path)
+
+
+def restore_client(options, token):
+	'''Builds a Panoptes client from a cached token without logging in.
+	Expired tokens are refreshed using the cached refresh token'''
+	client = Panoptes()
+	client.username       = options.username
+	client.password       = options.password
+	client.bearer_token   = token['bearer_token']
+	client.refresh_token  = token['refresh_token']
+	client.bearer_expires = datetime.datetime.fromtimestamp(token['expires'])
+	client.logged_in      = True
+	client.get_bearer_token()
+	return client
+
+
+def save_token(options, client):
+	if client.bearer_token is None:
+		return
+	tokens = load_cache(options.cache_dir, TOKENS_FILE)
+	tokens[options.username] = {
+		'bearer_token' : client.bearer_token,
+		'refresh_token': client.refresh_token,
+		'expires'      : client.bearer_expires.timestamp(),
+	}
+	save_cache(options.cache_dir, TOKENS_FILE, tokens)
+
+
+def connect(options):
+	'''Returns an authenticated Panoptes client, reusing a cached token if possible'''
+	token = load_cache(options.cache_dir, TOKENS_FILE).get(options.username)
+	if token is not None:
+		try:
+			client = restore_client(options, token)
+		except (PanoptesAPIException, IOError, KeyError) as e:
+			log.info("Cached token for {0} not usable => {1}".format(options.username, e))
+		else:
+			log.debug("Reusing cached token for {0}".format(options.username))
+			return client
+	log.debug("Logging in to Zooniverse as {0}".format(options.username))
+	client = Panoptes(username=options.username, password=options.password)
+	client.get_bearer_token()
+	return client
+
+# ---------
+# Interface
+# ---------
+
+@contextlib.contextmanager
+def session(options):
+	'''Context manager to use instead of Panoptes(username=..., password=...),
+	persisting the (possibly refreshed) token for later invocations'''
+	client = connect(options)
+	try:
+		with client:
+			yield client
+	finally:
+		save_token(options, client)
+
+
+def find_project(options, slug=None):
+	'''Finds a project by slug, reusing a recently cached project resource if possible'''
+	slug = slug or f"{options.username}/{options.project}"
+	log.info("Finding project by slug: {0}".format(slug))
+	projects = load_cache(options.cache_dir, PROJECTS_FILE)
+	entry = projects.get(slug)
+	if entry is not None and time.time() - entry['cached_at'] < PROJECT_MAX_AGE:
+		return Project(raw=entry['raw'])
+	project = Project.find(slug=slug)
+	projects[slug] = {'raw': project.raw, 'cached_at': time.time()}
+	save_cache(options.cache_dir, PROJECTS_FILE, projects)
+	return project
+
+
+def forget_project(options, slug=None):
+	'''Removes a project from cache after modifying it'''
+	slug = slug or f"{options.username}/{options.project}"
+	projects = load_cache(options.cache_dir, PROJECTS_FILE)
+	if projects.pop(slug, None) is not None:
+		save_cache(options.cache_dir, PROJECTS_FILE, projects)
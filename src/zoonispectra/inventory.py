@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+#--------------------
+# System wide imports
+# -------------------
+
+import time
+import json
+import sqlite3
+import logging
+
+#----------------------
+# Panoptes Client stuff
+# ---------------------
+
+from panoptes_client import Project, SubjectSet, Subject, SubjectWorkflowStatus
+
+#--------------
+# local imports
+# -------------
+
+from . import DEFAULT_PAGE_SIZE, DEFAULT_WORKERS, auth
+from .utils import with_client, bounded_map, batches
+
+# ----------------
+# Module constants
+# ----------------
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS project_t
+(
+	id                    TEXT PRIMARY KEY,
+	slug                  TEXT UNIQUE,
+	display_name          TEXT,
+	private               INTEGER,
+	primary_language      TEXT,
+	refreshed_at          REAL,  -- workflows and subject sets refresh timestamp
+	subjects_refreshed_at REAL   -- subject memberships and statuses refresh timestamp
+);
+
+CREATE TABLE IF NOT EXISTS workflow_t
+(
+	id              TEXT PRIMARY KEY,
+	project_id      TEXT,
+	display_name    TEXT,
+	subjects_count  INTEGER,
+	retired_count   INTEGER,
+	refreshed_at    REAL
+);
+
+CREATE TABLE IF NOT EXISTS subject_set_t
+(
+	id              TEXT PRIMARY KEY,
+	project_id      TEXT,
+	display_name    TEXT,
+	metadata        TEXT,
+	subjects_count  INTEGER,  -- as reported by Zooniverse
+	members_count   INTEGER,  -- as scanned in the last membership refresh
+	refreshed_at    REAL
+);
+
+CREATE TABLE IF NOT EXISTS workflow_subject_set_t
+(
+	workflow_id     TEXT,
+	subject_set_id  TEXT,
+	PRIMARY KEY (workflow_id, subject_set_id)
+);
+
+CREATE TABLE IF NOT EXISTS subject_set_member_t
+(
+	subject_set_id  TEXT,
+	subject_id      TEXT,
+	PRIMARY KEY (subject_set_id, subject_id)
+);
+
+CREATE TABLE IF NOT EXISTS subject_status_t
+(
+	workflow_id           TEXT,
+	subject_id            TEXT,
+	status_id             TEXT,
+	retirement_reason     TEXT,
+	classifications_count INTEGER,
+	refreshed_at          REAL,
+	PRIMARY KEY (workflow_id, subject_id)
+);
+'''
+
+# -----------------------
+# Module global variables
+# -----------------------
+
+log = logging.getLogger("zoonis")
+
+# ------------------
+# Auxiliar functions
+# ------------------
+
+def open_inventory(path):
+	'''Opens the inventory database. Without a path, the inventory only lives in memory'''
+	conn = sqlite3.connect(path if path is not None else ':memory:')
+	conn.row_factory = sqlite3.Row
+	conn.executescript(SCHEMA)
+	return conn
+
+
+def fresh(timestamp, max_age):
+	return timestamp is not None and time.time() - timestamp < max_age
+
+
+def find_project(conn, slug):
+	return conn.execute("SELECT * FROM project_t WHERE slug = ?", (slug,)).fetchone()
+
+
+def fetch_members(subject_set_id, page_size):
+	'''Returns the subject ids of a subject set, page by page'''
+	return [subject.id for subject in Subject.where(subject_set_id=subject_set_id, page_size=page_size)]
+
+
+def fetch_statuses(workflow_id, page_size, subject_ids=None):
+	'''Returns the subject workflow statuses of a workflow, page by page.
+	If given, only the statuses of subject_ids are requested'''
+	params = {'workflow_id': workflow_id, 'page_size': page_size}
+	if subject_ids is not None:
+		params['subject_id'] = ",".join(subject_ids)
+	return [(status.raw['links']['subject'], status.id, status.retirement_reason, status.classifications_count)
+		for status in SubjectWorkflowStatus.where(**params)]
+
+
+def refresh_project(conn, slug, project):
+	'''Refreshes the project, its workflows and its subject sets'''
+	now = time.time()
+	with conn:
+		conn.execute('''
+			INSERT INTO project_t (id, slug, display_name, private, primary_language, refreshed_at)
+			VALUES (?, ?, ?, ?, ?, ?)
+			ON CONFLICT(id) DO UPDATE SET slug = excluded.slug, display_name = excluded.display_name,
+			private = excluded.private, primary_language = excluded.primary_language, refreshed_at = excluded.refreshed_at''',
+			(project.id, slug, project.display_name, project.private, project.primary_language, now))
+		conn.execute('''
+			DELETE FROM workflow_subject_set_t
+			WHERE workflow_id IN (SELECT id FROM workflow_t WHERE project_id = ?)''', (project.id,))
+		conn.execute("DELETE FROM workflow_t WHERE project_id = ?", (project.id,))
+		for workflow in project.links.workflows:
+			log.debug("Refreshing Workflow id: {0}".format(workflow.id))
+			conn.execute('''
+				INSERT INTO workflow_t (id, project_id, display_name, subjects_count, retired_count, refreshed_at)
+				VALUES (?, ?, ?, ?, ?, ?)''',
+				(workflow.id, project.id, workflow.display_name, workflow.subjects_count,
+				workflow.retired_set_member_subjects_count, now))
+			conn.executemany("INSERT INTO workflow_subject_set_t (workflow_id, subject_set_id) VALUES (?, ?)",
+				[(workflow.id, ss.id) for ss in workflow.links.subject_sets])
+		# Subject sets keep the member count of their last membership scan
+		subject_set_ids = list()
+		for ss in SubjectSet.where(project_id=project.id):
+			log.debug("Refreshing Subject Set id: {0}".format(ss.id))
+			subject_set_ids.append(ss.id)
+			conn.execute('''
+				INSERT INTO subject_set_t (id, project_id, display_name, metadata, subjects_count, refreshed_at)
+				VALUES (?, ?, ?, ?, ?, ?)
+				ON CONFLICT(id) DO UPDATE SET display_name = excluded.display_name, metadata = excluded.metadata,
+				subjects_count = excluded.subjects_count, refreshed_at = excluded.refreshed_at''',
+				(ss.id, project.id, ss.display_name, json.dumps(ss.metadata), ss.set_member_subjects_count, now))
+		placeholders = ",".join("?" * len(subject_set_ids))
+		conn.execute(f'''
+			DELETE FROM subject_set_member_t WHERE subject_set_id IN
+			(SELECT id FROM subject_set_t WHERE project_id = ? AND id NOT IN ({placeholders}))''',
+			(project.id, *subject_set_ids))
+		conn.execute(f"DELETE FROM subject_set_t WHERE project_id = ? AND id NOT IN ({placeholders})",
+			(project.id, *subject_set_ids))
+
+
+def refresh_subjects(conn, client, project_id, page_size, workers):
+	'''Incrementally refreshes subject set memberships and subject statuses of a project.
+	Only subject sets whose subject count has changed are scanned again, and
+	only statuses of subjects not yet retired are requested again'''
+	now = time.time()
+	changed = [row['id'] for row in conn.execute('''
+		SELECT id FROM subject_set_t
+		WHERE project_id = ? AND (members_count IS NULL OR members_count != subjects_count)''', (project_id,))]
+	log.info("Scanning {0} changed Subject Sets".format(len(changed)))
+	def members(subject_set_id):
+		return with_client(client, fetch_members, subject_set_id, page_size)
+	for subject_set_id, subject_ids in bounded_map(members, changed, workers):
+		with conn:
+			conn.execute("DELETE FROM subject_set_member_t WHERE subject_set_id = ?", (subject_set_id,))
+			conn.executemany("INSERT OR IGNORE INTO subject_set_member_t (subject_set_id, subject_id) VALUES (?, ?)",
+				[(subject_set_id, subject_id) for subject_id in subject_ids])
+			conn.execute("UPDATE subject_set_t SET members_count = ? WHERE id = ?", (len(subject_ids), subject_set_id))
+	status_requests = list()
+	for row in conn.execute("SELECT id FROM workflow_t WHERE project_id = ?", (project_id,)).fetchall():
+		known = conn.execute("SELECT COUNT(*) FROM subject_status_t WHERE workflow_id = ?", (row['id'],)).fetchone()[0]
+		if not known:
+			status_requests.append((row['id'], None))
+			continue
+		pending = [r['subject_id'] for r in conn.execute('''
+			SELECT DISTINCT m.subject_id FROM subject_set_member_t AS m
+			JOIN workflow_subject_set_t AS w USING (subject_set_id)
+			LEFT JOIN subject_status_t AS s ON s.workflow_id = w.workflow_id AND s.subject_id = m.subject_id
+			WHERE w.workflow_id = ? AND s.retirement_reason IS NULL
+			ORDER BY m.subject_id''', (row['id'],))]
+		log.info("Workflow id: {0}, refreshing {1} non retired subject statuses".format(row['id'], len(pending)))
+		status_requests.extend((row['id'], batch) for batch in batches(pending, page_size))
+	def statuses(request):
+		return with_client(client, fetch_statuses, request[0], page_size, request[1])
+	for (workflow_id, _), rows in bounded_map(statuses, status_requests, workers):
+		with conn:
+			conn.executemany('''
+				INSERT OR REPLACE INTO subject_status_t
+				(workflow_id, subject_id, status_id, retirement_reason, classifications_count, refreshed_at)
+				VALUES (?, ?, ?, ?, ?, ?)''',
+				[(workflow_id, *row, now) for row in rows])
+	with conn:
+		conn.execute("UPDATE project_t SET subjects_refreshed_at = ? WHERE id = ?", (now, project_id))
+
+
+def forget_statuses(conn, project_id):
+	'''Forgets the subject statuses of a project, so that all of them are requested again'''
+	with conn:
+		conn.execute('''
+			DELETE FROM subject_status_t
+			WHERE workflow_id IN (SELECT id FROM workflow_t WHERE project_id = ?)''', (project_id,))
+
+
+def load(options, subjects=False):
+	'''Opens the inventory, refreshing it from Zooniverse only if stale.
+	Commands without --max-age always refresh it, and --full forgets the known subject statuses.
+	Returns the database connection and the project row'''
+	conn = open_inventory(options.inventory)
+	slug = f"{options.username}/{options.project}"
+	project = find_project(conn, slug)
+	max_age = getattr(options, 'max_age', 0)
+	stale = getattr(options, 'refresh', False) or project is None or not fresh(project['refreshed_at'], max_age)
+	stale_subjects = subjects and (stale or not fresh(project['subjects_refreshed_at'], max_age))
+	if stale or stale_subjects:
+		with auth.session(options) as client:
+			log.info("Refreshing inventory for project slug: {0}".format(slug))
+			zooniverse_project = Project.find(slug=slug)
+			refresh_project(conn, slug, zooniverse_project)
+			if getattr(options, 'full', False):
+				forget_statuses(conn, zooniverse_project.id)
+			if stale_subjects:
+				refresh_subjects(conn, client, zooniverse_project.id,
+					getattr(options, 'page_size', DEFAULT_PAGE_SIZE), getattr(options, 'workers', DEFAULT_WORKERS))
+		project = find_project(conn, slug)
+	else:
+		log.info("Using inventory for project slug: {0}".format(slug))
+	return conn, project
+
+
+def workflows(conn, project_id):
+	return conn.execute("SELECT * FROM workflow_t WHERE project_id = ? ORDER BY id", (project_id,)).fetchall()
+
+
+def subject_sets(conn, project_id):
+	return conn.execute("SELECT * FROM subject_set_t WHERE project_id = ? ORDER BY id", (project_id,)).fetchall()
+
+
+def workflow_subject_sets(conn, workflow_id):
+	return conn.execute('''
+		SELECT s.* FROM subject_set_t AS s
+		JOIN workflow_subject_set_t AS w ON w.subject_set_id = s.id
+		WHERE w.workflow_id = ? ORDER BY s.id''', (workflow_id,)).fetchall()
+
+
+def subject_statuses(conn, subject_set_id):
+	return conn.execute('''
+		SELECT m.subject_id, s.workflow_id, s.status_id, s.retirement_reason, s.classifications_count
+		FROM subject_set_member_t AS m
+		LEFT JOIN subject_status_t AS s USING (subject_id)
+		WHERE m.subject_set_id = ? ORDER BY m.subject_id, s.workflow_id''', (subject_set_id,)).fetchall()
+
+
+def subject_set_completion(conn, workflow_id, subject_set_id):
+	'''Returns the number of subjects in a subject set and how many of them are retired in a workflow'''
+	return tuple(conn.execute('''
+		SELECT COUNT(*), COUNT(s.retirement_reason) FROM subject_set_member_t AS m
+		LEFT JOIN subject_status_t AS s ON s.workflow_id = ? AND s.subject_id = m.subject_id
+		WHERE m.subject_set_id = ?''', (workflow_id, subject_set_id)).fetchone())
@@ -20,6 +20,14 @@ import logging
 from panoptes_client import Panoptes, Project, SubjectSet, Subject, Workflow, Classification, SubjectWorkflowStatus
 from panoptes_client.panoptes import PanoptesAPIException
 
+#--------------
+# local imports
+# -------------
+
+from tools_actionproject.jsonstream import iter_json_array
+
+from . import auth, inventory
+from .aggregate import aggregate as aggregate_classifications, open_state, update_state, state_rows
 
 # -----------------------
 # Module global variables
@@ -33,25 +41,22 @@ log = logging.getLogger("zoonis")
 
 def find(options):
 	'''Only for debugging purposes'''
-	with Panoptes(username=options.username, password=options.password):
-		slug = f"{options.username}/{options.project}"
-		log.info("Finding project by slug: {0}".format(slug))
-		project   = Project.find(slug=slug)
-		log.info("project id: {0}, display_name: {1}".format(project.id, project.display_name))
-		log.info("project private: {0}, primary_language: {1}".format(project.private, project.primary_language))
-		for workflow in project.links.workflows:
-			log.info("Workflow id: {0}, display_name: {1}".format(workflow.id, workflow.display_name))
-			numerator   = workflow.retired_set_member_subjects_count
-			denominator = workflow.subjects_count
-			percent     = int(100*numerator/denominator) if denominator != 0 else 0
-			log.info("Workflow subject stats = {0} / {1} ({2}%)".format(numerator,denominator,percent))
-			for ss in workflow.links.subject_sets:
-				log.info("Workflow Subject Set Id: {0}, Name: {1}".format(ss.id, ss.display_name))
+	conn, project = inventory.load(options)
+	log.info("project id: {0}, display_name: {1}".format(project['id'], project['display_name']))
+	log.info("project private: {0}, primary_language: {1}".format(bool(project['private']), project['primary_language']))
+	for workflow in inventory.workflows(conn, project['id']):
+		log.info("Workflow id: {0}, display_name: {1}".format(workflow['id'], workflow['display_name']))
+		numerator   = workflow['retired_count']
+		denominator = workflow['subjects_count']
+		percent     = int(100*numerator/denominator) if denominator != 0 else 0
+		log.info("Workflow subject stats = {0} / {1} ({2}%)".format(numerator,denominator,percent))
+		for ss in inventory.workflow_subject_sets(conn, workflow['id']):
+			log.info("Workflow Subject Set Id: {0}, Name: {1}".format(ss['id'], ss['display_name']))
 				
 
 def create(options):
 	'''Only for debugging purposes'''
-	with Panoptes(username=options.username, password=options.password):
+	with auth.session(options):
 		project = Project()
 		project.display_name     = " ".join(options.name)
 		project.description      = " ".join(options.description)
@@ -62,11 +67,9 @@ def create(options):
 
 
 def _export(options):
-	with Panoptes(username=options.username, password=options.password):
-		slug = f"{options.username}/{options.project}"
-		log.info("Finding project by slug: {0}".format(slug))
-		project   = Project.find(slug=slug)
-		log.info("Exporting project {0} classifications. This may take a while".format(slug))
+	with auth.session(options):
+		project   = auth.find_project(options)
+		log.info("Exporting project {0} classifications. This may take a while".format(options.project))
 		export_response = project.get_export(
 			'classifications',
 			generate=options.generate, 
@@ -92,13 +95,17 @@ def export(options):
 
 def classifications(options):
 	log.info("Getting Project Classification export")
-	with Panoptes(username=options.username, password=options.password):
-		log.info("Finding project by slug: {0}".format(options.project))
-		project   = Project.find(slug=options.project)
+	with auth.session(options):
+		project   = auth.find_project(options, slug=options.project)
 		classifications = list()
-		for classification in Classification.where(project_id=project.id):
+		params = {'project_id': project.id}
+		if options.last_id is not None:
+			params['last_id'] = options.last_id		# Only classifications newer than this one
+		for classification in Classification.where(**params):
 			row = {}
 			row['id'] = classification.id
+			row['workflow_id'] = classification.raw['links'].get('workflow')
+			row['subject_ids'] = ";".join(classification.raw['links'].get('subjects', []))
 			row['created_at'] = classification.created_at
 			row['updated_at'] = classification.updated_at
 			row['completed'] = classification.completed
@@ -110,3 +117,19 @@ def classifications(options):
 		with open(options.file, 'w') as fd:
 			json.dump(classifications, fp=fd, indent=2)
 
+
+def aggregate(options):
+	log.info("Aggregating classifications from {0}".format(options.input_file))
+	if options.state_file is None:
+		with open(options.input_file) as fd:
+			rows = aggregate_classifications(iter_json_array(fd), options.workflow)
+	else:
+		conn = open_state(options.state_file)
+		with open(options.input_file) as fd:
+			count, changed = update_state(conn, iter_json_array(fd), options.workflow)
+		log.info("Added {0} new classifications of {1} subjects to {2}".format(count, len(changed), options.state_file))
+		rows = state_rows(conn, changed if options.changed else None)
+		conn.close()
+	with open(options.output_file, 'w') as fd:
+		json.dump(rows, fp=fd, indent=2)
+	log.info("Written {0} aggregated subjects to {1}".format(len(rows), options.output_file))
@@ -10,8 +10,16 @@
 # System wide imports
 # -------------------
 
+import os
+import re
+import time
 import json
 import logging
+import itertools
+import threading
+import concurrent.futures
+
+import requests
 
 #----------------------
 # Panoptes Client stuff
@@ -19,6 +27,31 @@ import logging
 
 from panoptes_client import Panoptes, Project, SubjectSet, Subject, Workflow, Classification, SubjectWorkflowStatus
 from panoptes_client.panoptes import PanoptesAPIException
+from urllib3.exceptions import NewConnectionError
+
+#--------------
+# local imports
+# -------------
+
+from tools_actionproject import ratelimit
+from tools_actionproject.jsonstream import iter_json_array
+
+from . import auth, inventory
+from .utils import with_client, bounded_map, batches
+
+# ----------------
+# Module constants
+# ----------------
+
+BACKOFF  = 2    # Initial delay in seconds before retrying a subject save
+PROGRESS = 100  # Log upload progress every PROGRESS subjects
+LINKERS  = 1    # Threads linking subject batches, they share the subject set object
+PROBE_TIMEOUT = 10 # Timeout in seconds for image HEAD probes
+PROBE_CACHED  = (200, 404, 410) # Definitive probe statuses, kept in the probe cache
+LOOKUP_SUBJECTS = 500 # Most recent project subjects searched after a save with unknown outcome
+
+# HTTP status of the server errors reported by the Panoptes client
+API_STATUS = re.compile(r'HTTP status code (\d+)')
 
 # -----------------------
 # Module global variables
@@ -26,6 +59,9 @@ from panoptes_client.panoptes import PanoptesAPIException
 
 log = logging.getLogger("zoonis")
 
+# Journal records are written both by the uploading and the linking threads
+journal_lock = threading.Lock()
+
 # ------------------
 # Auxiliar functions
 # ------------------
@@ -55,9 +91,9 @@ def epi_v_remapper(collection):
 		'5_Take_an_image_of_a': 'url',
 		'6_Observations'      : 'comment',
 	}
-	# remaps each dictionary entry in collection with new names
-	result =  [{name_map[name]: val for name, val in row.items()} for row in collection]
-	return list(map(remap_location,result))
+	# lazily remaps each dictionary entry in collection with new names
+	result =  ({name_map[name]: val for name, val in row.items()} for row in collection)
+	return map(remap_location, result)
 
 
 def remap_to_subject(item):
@@ -79,57 +115,273 @@ def remap_to_subject(item):
 	return subject
 
 
-def create_subjects(project, metadata_file):
-	with open(metadata_file,'r') as fd:
-		log.info("Reading metadata file {0}".format(metadata_file))
-		result = fd.readlines()
-		result = " ".join(result)
-		result = json.loads(result)
-		collection = result["data"]
-		collection = epi_v_remapper(collection)
-		subjects   = list(map(remap_to_subject, collection))
-		log.info("Saving {0} subjects".format(len(subjects)))
-		for subject in subjects:
-			subject.links.project = project.id
+def save_outcome(e):
+	'''Classifies a failed subject save: 'unsent' if the request never reached the server,
+	'unknown' if the subject may have been created anyway, 'rejected' if retrying is useless'''
+	if isinstance(e, requests.exceptions.ConnectTimeout):
+		return 'unsent'
+	if isinstance(e, requests.exceptions.ConnectionError):
+		reason = getattr(e.args[0], 'reason', None) if e.args else None
+		return 'unsent' if isinstance(reason, NewConnectionError) else 'unknown'
+	if isinstance(e, PanoptesAPIException):
+		status = API_STATUS.search(str(e))
+		return 'unknown' if status is not None and int(status.group(1)) >= 500 else 'rejected'
+	return 'unknown' if isinstance(e, IOError) else 'rejected'
+
+
+def find_subject(project, item):
+	'''Looks for a subject already created for an item among the most recent project subjects'''
+	subjects = Subject.where(project_id=project.id, sort='-id', page_size=100)
+	for subject in itertools.islice(subjects, LOOKUP_SUBJECTS):
+		if subject.metadata.get('id') == item['id']:
+			return subject
+	return None
+
+
+def save_subject(project, item, retries):
+	'''Creates and saves a Zooniverse Subject, retrying with exponential backoff.
+	Saves are only retried when the subject was certainly not created, looking it up
+	first when it may have been. Returns None if the subject could not be saved'''
+	subject = remap_to_subject(item)
+	subject.links.project = project.id
+	for attempt in range(retries+1):
+		try:
 			subject.save()
-		return subjects
-		
+		except (PanoptesAPIException, IOError) as e:
+			outcome = save_outcome(e)
+			if outcome == 'rejected':
+				log.error("Giving up saving subject for item {0} => {1}".format(item['id'], e))
+				return None
+			if attempt < retries or outcome == 'unknown':
+				# Also gives a subject being created time to show up in the lookup
+				delay = BACKOFF * 2**attempt
+				log.warning("Error saving subject for item {0} => {1}. Waiting {2} seconds".format(item['id'], e, delay))
+				time.sleep(delay)
+			if outcome == 'unknown':
+				try:
+					existing = find_subject(project, item)
+				except (PanoptesAPIException, IOError) as lookup_error:
+					log.error("Giving up saving subject for item {0}, it may have been created => {1}".format(item['id'], lookup_error))
+					return None
+				if existing is not None:
+					log.info("Found subject #{0} for item {1} created despite the error".format(existing.id, item['id']))
+					return existing
+			if attempt == retries:
+				log.error("Giving up saving subject for item {0} => {1}".format(item['id'], e))
+				return None
+		else:
+			return subject
+
+
+def upload_subjects(client, project, items, workers, retries):
+	'''Saves subjects concurrently in a bounded pool of workers.
+	Yields (item, subject) pairs as saves complete'''
+	def save(item):
+		return with_client(client, save_subject, project, item, retries)
+	yield from bounded_map(save, items, workers)
+
+
+def probe_image(session, url):
+	'''Probes an image URL with a HEAD request. Returns (status, content-type, size)'''
+	ratelimit.limiter(url).acquire()
+	try:
+		response = session.head(url, allow_redirects=True, timeout=PROBE_TIMEOUT)
+		if response.status_code == 405:
+			# HEAD not allowed by the server, a one byte ranged GET gives the same headers
+			response = session.get(url, headers={'Range': 'bytes=0-0'}, stream=True, allow_redirects=True, timeout=PROBE_TIMEOUT)
+			response.close()
+	except IOError as e:
+		log.debug("Error probing image {0} => {1}".format(url, e))
+		return None, None, None
+	status, size = response.status_code, response.headers.get('Content-Length')
+	if status == 206:
+		# Partial content of the ranged GET, the whole size comes in Content-Range: bytes 0-0/<size>
+		status, size = 200, response.headers.get('Content-Range', '').rpartition('/')[2]
+		size = size if size.isdigit() else None
+	return status, response.headers.get('Content-Type'), int(size) if size is not None else None
+
+
+def image_ok(probe):
+	'''A good image answers OK with an image content type and non zero size'''
+	status, content_type, size = probe
+	return status == 200 and content_type is not None and content_type.startswith('image/') and size != 0
+
+
+def load_probe_cache(path):
+	'''Loads the URL => (status, content-type, size) cache of previous image probes'''
+	if path is None or not os.path.exists(path):
+		return dict()
+	with open(path) as fd:
+		return {url: tuple(probe) for url, probe in json.load(fd).items()}
+
+
+def save_probe_cache(path, cache):
+	'''Saves the image probes cache for the next run'''
+	if path is None:
+		return
+	tmp_path = path + '.tmp'
+	with open(tmp_path, 'w') as fd:
+		json.dump(cache, fp=fd)
+	os.replace(tmp_path, path)
+	log.info("Saved {0} image probes to {1}".format(len(cache), path))
+
+
+def probe_images(items, cache, workers):
+	'''Filters out items whose image URL is broken, probing concurrently the URLs not in cache.
+	Definitive probe results are added to the cache'''
+	session = requests.Session()
+	def probe(item):
+		url = item['url']
+		return cache[url] if url in cache else probe_image(session, url)
+	for item, result in bounded_map(probe, items, workers):
+		# Network errors, server errors, throttling or denied access may be transient, so they are not cached
+		if result[0] in PROBE_CACHED:
+			cache[item['url']] = result
+		if image_ok(result):
+			yield item
+		else:
+			log.warning("Skipping item {0} with bad image {1} => {2}".format(item['id'], item['url'], result))
+
+
+def read_journal(path):
+	'''Reads the upload journal of a previous, possibly failed, subject set creation'''
+	journal = {'subject_set_id': None, 'subjects': dict(), 'linked': set(), 'workflows': set()}
+	if path is None or not os.path.exists(path):
+		return journal
+	with open(path) as fd:
+		for line in fd:
+			if not line.strip():
+				continue	# may be a partially written last line
+			try:
+				record = json.loads(line)
+			except ValueError:
+				log.warning("Skipping corrupted journal line: {0}".format(line))
+				continue
+			if 'subject_set_id' in record:
+				journal['subject_set_id'] = record['subject_set_id']
+			elif 'subject_id' in record:
+				journal['subjects'][record['id']] = record['subject_id']
+			elif 'linked' in record:
+				journal['linked'].update(record['linked'])
+			elif 'workflow_id' in record:
+				journal['workflows'].add(record['workflow_id'])
+	log.info("Read journal {0} with {1} saved subjects".format(path, len(journal['subjects'])))
+	return journal
+
+
+def write_journal(fd, record):
+	'''Appends a record to the upload journal as soon as the related operation succeeds'''
+	if fd is not None:
+		with journal_lock:
+			fd.write(json.dumps(record) + '\n')
+			fd.flush()
+
+
+def create_subjects(client, project, metadata_file, workers, retries, journal, journal_fd, probe_cache):
+	'''Saves the subjects not already recorded in the journal. Yields the new subject ids as they are saved'''
+	log.info("Saving subjects from metadata file {0} with {1} workers".format(metadata_file, workers))
+	failed   = 0
+	start    = time.monotonic()
+	with open(metadata_file,'r') as fd:
+		# Items are read, remapped and uploaded as a stream
+		collection = epi_v_remapper(iter_json_array(fd, "data"))
+		collection = (item for item in collection if item['id'] not in journal['subjects'])
+		if probe_cache is not None:
+			collection = probe_images(collection, probe_cache, workers)
+		i = 0
+		for i, (item, subject) in enumerate(upload_subjects(client, project, collection, workers, retries), 1):
+			if subject is None:
+				failed += 1
+			else:
+				write_journal(journal_fd, {'id': item['id'], 'subject_id': subject.id})
+				yield subject.id
+			if i % PROGRESS == 0:
+				rate = i / (time.monotonic() - start)
+				log.info("Processed {0} subjects ({1:.1f} subjects/s)".format(i, rate))
+	log.info("Processed {0} subjects in total".format(i))
+	if failed:
+		log.error("{0} subjects could not be saved".format(failed))
+
+
+def link_batch(subject_set, batch, journal_fd):
+	'''Links a batch of subject ids to the subject set. Returns the request latency'''
+	start = time.monotonic()
+	# Posts the links only, SubjectSet.add() would reload the whole subject set for every batch
+	subject_set.links.subjects.add(batch)
+	latency = time.monotonic() - start
+	write_journal(journal_fd, {'linked': batch})
+	log.info("Added {0} subjects to Subject Set {1} in {2:.2f} s".format(len(batch), subject_set.id, latency))
+	return latency
+
+
+def link_workflow(workflow, subject_set, journal_fd):
+	'''Links the subject set to a workflow'''
+	workflow.add_subject_sets(subject_set)
+	write_journal(journal_fd, {'workflow_id': workflow.id})
+	log.info("Added Subject Set {0} to Workflow {1}".format(subject_set.id, workflow.id))
+
+
 # ----------------------
 # Coomand implementation
 # ----------------------
 
 def create(options):
 	log.info("Creating new Subject Set for project {0}".format(options.project))
-	with Panoptes(username=options.username, password=options.password):
-		slug = f"{options.username}/{options.project}"
-		log.info("Finding project by slug: {0}".format(slug))
-		project   = Project.find(slug=slug)
-		workflows = project.links.workflows
-		subject_set = SubjectSet()
-		subject_set.links.project = project
-		subject_set.display_name = " ".join(options.name)
-		subject_set.save()
-		subjects = create_subjects(project, options.file)
-		subject_set.add(subjects)
-		for workflow in workflows:
-			workflow.add_subject_sets(subject_set)
-			log.info("AddingSubject Set {0} to Workflow {1}".format(subject_set.id,workflow.id))
-		log.info("Created new Subject Set #{0}".format(subject_set.id))
+	if options.resume and options.journal is None:
+		raise ValueError("Resuming a Subject Set creation needs a journal file")
+	if options.journal and not (options.resume or options.force) and os.path.exists(options.journal) and os.path.getsize(options.journal):
+		raise ValueError("Journal file {0} already exists, use --resume to resume or --force to start over".format(options.journal))
+	journal = read_journal(options.journal) if options.resume else read_journal(None)
+	journal_fd = open(options.journal, 'a' if options.resume else 'w') if options.journal else None
+	# A probe cache implies probing the images
+	probe_cache = load_probe_cache(options.probe_cache) if options.probe or options.probe_cache else None
+	try:
+		with auth.session(options) as client:
+			project   = auth.find_project(options)
+			workflows = project.links.workflows
+			if journal['subject_set_id'] is not None:
+				subject_set = SubjectSet.find(journal['subject_set_id'])
+				log.info("Resuming Subject Set #{0}".format(subject_set.id))
+			else:
+				subject_set = SubjectSet()
+				subject_set.links.project = project
+				subject_set.display_name = " ".join(options.name)
+				subject_set.save()
+				write_journal(journal_fd, {'subject_set_id': subject_set.id})
+			# Journaled subjects saved but not linked in a previous run are linked first.
+			# Batches are linked while the next subjects are still being uploaded
+			subject_ids = itertools.chain(
+				(sid for sid in journal['subjects'].values() if sid not in journal['linked']),
+				create_subjects(client, project, options.file, options.workers, options.retries, journal, journal_fd, probe_cache)
+			)
+			with concurrent.futures.ThreadPoolExecutor(max_workers=LINKERS) as executor:
+				link_tasks = [executor.submit(with_client, client, link_batch, subject_set, batch, journal_fd)
+					for batch in batches(subject_ids, options.batch_size)]
+				latencies = [task.result() for task in link_tasks]
+			if latencies:
+				log.info("Linked {0} batches, mean latency {1:.2f} s, max latency {2:.2f} s".format(
+					len(latencies), sum(latencies)/len(latencies), max(latencies)))
+			with concurrent.futures.ThreadPoolExecutor(max_workers=options.workers) as executor:
+				link_tasks = [executor.submit(with_client, client, link_workflow, workflow, subject_set, journal_fd)
+					for workflow in workflows if workflow.id not in journal['workflows']]
+				for task in link_tasks:
+					task.result()
+			log.info("Created new Subject Set #{0}".format(subject_set.id))
+	finally:
+		if journal_fd is not None:
+			journal_fd.close()
+		if probe_cache is not None:
+			save_probe_cache(options.probe_cache, probe_cache)
 
 
 
 def show(options):
 	'''Only for debugging purposes'''
 	log.info("Getting subject sets for this project")
-	with Panoptes(username=options.username, password=options.password):
-		slug = f"{options.username}/{options.project}"
-		log.info("Finding project by slug: {0}".format(slug))
-		project   = Project.find(slug=slug)
-		for ss in SubjectSet.where(project_id=project.id):
-			log.info("SubjectSet id #{0}, name {1}, metadata {2}".format(ss.id, ss.display_name, ss.metadata))
-			for subject in ss.subjects:
-				status = next(SubjectWorkflowStatus.where(subject_id=subject.id))
-				log.info("  Subject id #{0}, Status id #{1}".format(subject.id, status.id))
-				log.info("  Subject Retirement Reason {0}".format(status.retirement_reason))
-				log.info("  Subject Classification Count {0}".format(status.classifications_count))
-
+	conn, project = inventory.load(options, subjects=True)
+	for ss in inventory.subject_sets(conn, project['id']):
+		log.info("SubjectSet id #{0}, name {1}, metadata {2}".format(ss['id'], ss['display_name'], json.loads(ss['metadata'])))
+		for status in inventory.subject_statuses(conn, ss['id']):
+			log.info("  Subject id #{0}, Workflow id #{1}, Status id #{2}".format(status['subject_id'], status['workflow_id'], status['status_id']))
+			log.info("  Subject Retirement Reason {0}".format(status['retirement_reason']))
+			log.info("  Subject Classification Count {0}".format(status['classifications_count']))
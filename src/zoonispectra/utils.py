@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+#--------------------
+# System wide imports
+# -------------------
+
+import logging
+import concurrent.futures
+
+# -----------------------
+# Module global variables
+# -----------------------
+
+log = logging.getLogger("zoonis")
+
+# ------------------
+# Auxiliar functions
+# ------------------
+
+def with_client(client, function, *args):
+	'''Runs a function in a worker thread with the (shared) authenticated Panoptes client'''
+	with client:
+		return function(*args)
+
+
+def bounded_map(function, items, workers):
+	'''Applies function to items in a pool of workers, keeping a bounded number of items in flight.
+	Yields (item, result) pairs in completion order'''
+	with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+		pending = dict()
+		for item in items:
+			if len(pending) >= 2*workers:
+				done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+				for future in done:
+					yield pending.pop(future), future.result()
+			pending[executor.submit(function, item)] = item
+		for future in concurrent.futures.as_completed(pending):
+			yield pending[future], future.result()
+
+
+def batches(iterable, size):
+	'''Splits an iterable into lists of at most size items'''
+	batch = list()
+	for item in iterable:
+		batch.append(item)
+		if len(batch) == size:
+			yield batch
+			batch = list()
+	if batch:
+		yield batch
@@ -20,6 +20,11 @@ import logging
 from panoptes_client import Panoptes, Project, SubjectSet, Subject, Workflow, Classification, SubjectWorkflowStatus
 from panoptes_client.panoptes import PanoptesAPIException
 
+#--------------
+# local imports
+# -------------
+
+from . import auth, inventory
 
 # -----------------------
 # Module global variables
@@ -33,10 +38,8 @@ log = logging.getLogger("zoonis")
 
 def create(options):
 	'''Only for debugging purposes'''
-	with Panoptes(username=options.username, password=options.password):
-		slug = f"{options.username}/{options.project}"
-		log.info("Finding project by slug: {0}".format(slug))
-		project   = Project.find(slug=slug)
+	with auth.session(options):
+		project   = auth.find_project(options)
 		workflow = Workflow()
 		workflow.links.project    = project
 		workflow.display_name     = " ".join(options.name)
@@ -45,68 +48,60 @@ def create(options):
 		workflow.kk = "foo"
 		
 		workflow.save()
+		auth.forget_project(options)
 		log.info("{0}".format(workflow))
 		project.reload()
 		log.info("{0}".format(project.links.workflows))
 
 		
 def subjectsets(options):
-	with Panoptes(username=options.username, password=options.password):
-		slug = f"{options.username}/{options.project}"
-		log.info("Finding project by slug: {0}".format(slug))
-		project   = Project.find(slug=slug)
-		with open(options.file, 'w') as fd:
-			workflows = list()
-			for workflow in project.links.workflows:
-				subject_sets = list()
-				for ss in workflow.links.subject_sets:
-					subject_sets.append({
-						'subjectset_id' : ss.id,
-						'display_name'  : ss.display_name,
-						})
-				workflows.append({
-					'workflow_id': workflow.id, 'subject_sets': subject_sets
-				})
-			json.dump(workflows, fp=fd, indent=2)
-
-
-
-def completion(options):
-	with Panoptes(username=options.username, password=options.password):
-		slug = f"{options.username}/{options.project}"
-		log.info("Finding project by slug: {0}".format(slug))
-		project   = Project.find(slug=slug)
+	conn, project = inventory.load(options)
+	with open(options.file, 'w') as fd:
 		workflows = list()
-		for workflow in project.links.workflows:
-			log.info("Workflow id: {0}, display_name: {1}".format(workflow.id, workflow.display_name))
-			numerator   = workflow.retired_set_member_subjects_count
-			denominator = workflow.subjects_count
-			percentage = int(100*numerator/denominator) if denominator != 0 else 0
+		for workflow in inventory.workflows(conn, project['id']):
 			subject_sets = list()
-			for ss in workflow.links.subject_sets:
-				retired_count  = 0
-				subjects_count = 0
-				for subject in ss.subjects:
-					status = next(SubjectWorkflowStatus.where(subject_id=subject.id))
-					subjects_count += 1
-					if status.retirement_reason is not None:
-						retired_count += 1
+			for ss in inventory.workflow_subject_sets(conn, workflow['id']):
 				subject_sets.append({
-					'id'             : ss.id,
-					'display_name'   : ss.display_name,
-					'subjects_count' : subjects_count,
-					'retired_count'  : retired_count,
-					'percentage'     : int(100*retired_count/subjects_count) if subjects_count != 0 else 0,
-				})
+					'subjectset_id' : ss['id'],
+					'display_name'  : ss['display_name'],
+					})
 			workflows.append({
-				'id'             : workflow.id,
-				'display_name'   : workflow.display_name,
-				'subjects_count' : denominator,
-				'retired_count'  : numerator,
-				'percentage'     : percentage,
-				'subject_sets'   : subject_sets
+				'workflow_id': workflow['id'], 'subject_sets': subject_sets
+			})
+		json.dump(workflows, fp=fd, indent=2)
+
+
+
+def completion(options):
+	# Retired subjects never un-retire, so the inventory only queries again the statuses
+	# of subjects not yet retired, unless a full reconciliation is requested
+	conn, project = inventory.load(options, subjects=True)
+	workflows = list()
+	for workflow in inventory.workflows(conn, project['id']):
+		log.info("Workflow id: {0}, display_name: {1}".format(workflow['id'], workflow['display_name']))
+		numerator   = workflow['retired_count']
+		denominator = workflow['subjects_count']
+		percentage = int(100*numerator/denominator) if denominator != 0 else 0
+		subject_sets = list()
+		for ss in inventory.workflow_subject_sets(conn, workflow['id']):
+			subjects_count, retired_count = inventory.subject_set_completion(conn, workflow['id'], ss['id'])
+			subject_sets.append({
+				'id'             : ss['id'],
+				'display_name'   : ss['display_name'],
+				'subjects_count' : subjects_count,
+				'retired_count'  : retired_count,
+				'percentage'     : int(100*retired_count/subjects_count) if subjects_count != 0 else 0,
 			})
-			log.info(f"Global completion percentage for workflow '{workflow.display_name}' is {percentage}%")
+		workflows.append({
+			'id'             : workflow['id'],
+			'display_name'   : workflow['display_name'],
+			'subjects_count' : denominator,
+			'retired_count'  : numerator,
+			'percentage'     : percentage,
+			'subject_sets'   : subject_sets
+		})
+		log.info(f"Global completion percentage for workflow '{workflow['display_name']}' is {percentage}%")
+	conn.close()
 	with open(options.file, 'w') as fd:
 		json.dump(workflows, fp=fd, indent=2)
 	print(workflows)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+#--------------------
+# System wide imports
+# -------------------
+
+import os
+import tempfile
+import unittest
+
+#--------------
+# local imports
+# -------------
+
+from zoonispectra import aggregate
+
+# ----------------
+# Module constants
+# ----------------
+
+def classification(ident, subject, answer, workflow=17, user='u1'):
+	return {
+		"classification_id" : ident,
+		"workflow_id"       : workflow,
+		"subject_ids"       : subject,
+		"user_name"         : user,
+		"annotations"       : [
+			{"task": "T0", "value": answer},
+			{"task": "T1", "value": [{"x": 10, "y": 20}]},	# drawing marks give no votes
+		],
+	}
+
+CLASSIFICATIONS = [
+	classification(1, "100", "LED"),
+	classification(2, "100", "LED", user='u2'),
+	classification(3, "100", "HPS", user='u3'),
+	classification(4, "200", "HPS"),
+	classification(5, "200", ["MV", "LPS"]),
+	classification(6, "100", "LED", workflow=18),
+]
+
+# ----------
+# Test cases
+# ----------
+
+class AggregateTestCase(unittest.TestCase):
+
+	def test_consensus(self):
+		rows = aggregate.aggregate(CLASSIFICATIONS, 17)
+		self.assertEqual([(row['workflow_id'], row['subject_id'], row['classifications']) for row in rows],
+			[('17', '100', 3), ('17', '200', 2)])
+		task = rows[0]['tasks']['T0']
+		self.assertEqual(task['votes'], {'HPS': 1, 'LED': 2})
+		self.assertEqual(task['consensus'], 'LED')
+		self.assertAlmostEqual(task['agreement'], 2/3)
+		self.assertNotIn('T1', rows[0]['tasks'])
+
+	def test_ties(self):
+		task = aggregate.aggregate(CLASSIFICATIONS, 17)[1]['tasks']['T0']
+		self.assertEqual(task['votes'], {'HPS': 1, 'LPS': 1, 'MV': 1})
+		self.assertEqual(task['consensus'], 'HPS')
+
+	def test_workflows(self):
+		rows = aggregate.aggregate(CLASSIFICATIONS)
+		self.assertEqual([(row['workflow_id'], row['subject_id']) for row in rows],
+			[('17', '100'), ('17', '200'), ('18', '100')])
+
+	def test_combo_task(self):
+		combo = {"classification_id": 1, "subject_ids": "300", "annotations": [
+			{"task": "T2", "value": [{"task": "T3", "value": "Yes"}, {"task": "T4", "value": {"choice": "LED"}}]}]}
+		rows = aggregate.aggregate([combo])
+		self.assertEqual(rows[0]['workflow_id'], None)
+		self.assertEqual(sorted(rows[0]['tasks']), ['T3', 'T4'])
+
+	@unittest.skipIf(aggregate.pandas is None, "pandas not installed")
+	def test_pandas(self):
+		without_workflow = [dict(c, workflow_id=None) for c in CLASSIFICATIONS]
+		for classifications in (CLASSIFICATIONS, without_workflow):
+			subjects = dict()
+			votes = list(aggregate.votes(classifications, subjects))
+			self.assertEqual(sorted(aggregate.count_pandas(votes), key=str), sorted(aggregate.count_python(votes), key=str))
+
+
+class StateTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmpdir = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.tmpdir.name, 'state.db')
+		self.conn = aggregate.open_state(self.path)
+
+	def tearDown(self):
+		self.conn.close()
+		self.tmpdir.cleanup()
+
+	def test_incremental(self):
+		count, changed = aggregate.update_state(self.conn, CLASSIFICATIONS[:3], 17)
+		self.assertEqual((count, changed), (3, {('17', '100')}))
+		# Exports hold all the classifications so far
+		count, changed = aggregate.update_state(self.conn, CLASSIFICATIONS, 17)
+		self.assertEqual((count, changed), (2, {('17', '200')}))
+		self.assertEqual(aggregate.state_rows(self.conn), aggregate.aggregate(CLASSIFICATIONS, 17))
+		self.assertEqual(aggregate.update_state(self.conn, CLASSIFICATIONS, 17), (0, set()))
+
+	def test_changed_rows(self):
+		aggregate.update_state(self.conn, CLASSIFICATIONS[:4], 17)
+		rows = aggregate.state_rows(self.conn, {('17', '200')})
+		self.assertEqual([row['subject_id'] for row in rows], ['200'])
+
+	def test_without_workflow(self):
+		classifications = [dict(c, workflow_id=None) for c in CLASSIFICATIONS]
+		aggregate.update_state(self.conn, classifications[:2])
+		aggregate.update_state(self.conn, classifications)
+		self.assertEqual(aggregate.state_rows(self.conn), aggregate.aggregate(classifications))
+
+	def test_other_workflow(self):
+		aggregate.update_state(self.conn, CLASSIFICATIONS, 17)
+		with self.assertRaises(ValueError):
+			aggregate.update_state(self.conn, CLASSIFICATIONS, 18)
+
+	def test_persisted(self):
+		aggregate.update_state(self.conn, CLASSIFICATIONS[:2], 17)
+		self.conn.close()
+		self.conn = aggregate.open_state(self.path)
+		self.assertEqual(aggregate.update_state(self.conn, CLASSIFICATIONS, 17)[0], 3)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+#--------------------
+# System wide imports
+# -------------------
+
+import os
+import tempfile
+import unittest
+
+#--------------
+# local imports
+# -------------
+
+from tools_actionproject import dedup
+
+# ----------------
+# Module constants
+# ----------------
+
+ENTRIES = [
+	{"ec5_uuid": "a1", "title": "first",  "uploaded_at": "2021-03-01"},
+	{"ec5_uuid": "b2", "title": "second", "uploaded_at": "2021-03-01"},
+	{"ec5_uuid": "c3", "title": "third",  "uploaded_at": "2021-03-01"},
+]
+
+CAPACITY = 1000
+
+# ----------
+# Test cases
+# ----------
+
+class DedupTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmpdir = tempfile.TemporaryDirectory()
+		self.seen = self.open()
+
+	def tearDown(self):
+		self.seen.close()
+		self.tmpdir.cleanup()
+
+	def open(self):
+		return dedup.SeenSet(self.tmpdir.name, 'entries', capacity=CAPACITY)
+
+	def reopen(self):
+		self.seen.close()
+		self.seen = self.open()
+
+	def unique(self, entries, ignore=()):
+		pairs = list(dedup.unique(entries, self.seen, 'ec5_uuid', ignore))
+		self.seen.update(key for key, _ in pairs)
+		return [entry['ec5_uuid'] for _, entry in pairs]
+
+	def test_skip_seen(self):
+		self.assertEqual(self.unique(ENTRIES[:2]), ['a1', 'b2'])
+		self.reopen()
+		self.assertEqual(self.unique(ENTRIES), ['c3'])
+		self.assertEqual(self.seen.duplicates, 2)
+		self.assertEqual(self.unique(ENTRIES), [])
+
+	def test_skip_repeated(self):
+		self.assertEqual(self.unique(ENTRIES + ENTRIES[::-1]), ['a1', 'b2', 'c3'])
+		self.assertEqual(self.seen.duplicates, 3)
+
+	def test_not_added_until_processed(self):
+		list(dedup.unique(ENTRIES, self.seen, 'ec5_uuid'))
+		self.assertEqual(self.unique(ENTRIES), ['a1', 'b2', 'c3'])
+
+	def test_edited(self):
+		self.unique(ENTRIES)
+		edited = dict(ENTRIES[0], title="edited")
+		self.assertEqual(self.unique([edited]), ['a1'])
+
+	def test_ignored_fields(self):
+		self.unique(ENTRIES, ignore=('uploaded_at',))
+		reuploaded = [dict(entry, uploaded_at="2021-04-01") for entry in ENTRIES]
+		self.assertEqual(self.unique(reuploaded, ignore=('uploaded_at',)), [])
+		self.assertEqual(self.unique(reuploaded), ['a1', 'b2', 'c3'])
+
+	def test_bloom_rebuilt(self):
+		self.unique(ENTRIES)
+		self.seen.close()
+		os.remove(os.path.join(self.tmpdir.name, 'entries.bloom'))
+		self.seen = self.open()
+		self.assertEqual(self.unique(ENTRIES), [])
+
+	def test_bloom_false_positives(self):
+		# Keys past the filter capacity still give exact answers
+		keys = [dedup.record_key({"id": i}, 'id') for i in range(4 * CAPACITY)]
+		self.seen.update(keys[::2])
+		self.assertTrue(all(key in self.seen for key in keys[::2]))
+		self.assertFalse(any(key in self.seen for key in keys[1::2]))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+#--------------------
+# System wide imports
+# -------------------
+
+import os
+import json
+import tempfile
+import unittest
+import argparse
+
+#--------------
+# local imports
+# -------------
+
+from actiontool import exports
+
+# ----------------
+# Module constants
+# ----------------
+
+OLD = [
+	{"ec5_uuid": "a1", "title": "kept",     "uploaded_at": "2021-03-01"},
+	{"ec5_uuid": "b2", "title": "edited",   "uploaded_at": "2021-03-01"},
+	{"ec5_uuid": "c3", "title": "removed",  "uploaded_at": "2021-03-01"},
+	{"ec5_uuid": "d4", "title": "reloaded", "uploaded_at": "2021-03-01"},
+]
+
+NEW = [
+	{"ec5_uuid": "a1", "title": "kept",     "uploaded_at": "2021-03-01"},
+	{"ec5_uuid": "d4", "title": "reloaded", "uploaded_at": "2021-04-01"},
+	{"ec5_uuid": "e5", "title": "added",    "uploaded_at": "2021-04-01"},
+	{"ec5_uuid": "b2", "title": "changed",  "uploaded_at": "2021-03-01"},
+]
+
+# ----------
+# Test cases
+# ----------
+
+class DiffTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmpdir = tempfile.TemporaryDirectory()
+		self.old_file = self.write('old.json', OLD)
+		self.new_file = self.write('new.json', NEW)
+
+	def tearDown(self):
+		self.tmpdir.cleanup()
+
+	def path(self, name):
+		return os.path.join(self.tmpdir.name, name)
+
+	def write(self, name, records):
+		with open(self.path(name), 'w') as fd:
+			json.dump(records, fd)
+		return self.path(name)
+
+	def read(self, name):
+		with open(self.path(name)) as fd:
+			return [record['ec5_uuid'] for record in json.load(fd)]
+
+	def diff(self, ignore=None, removed=True):
+		exports.diff(argparse.Namespace(kind='entries', old_file=self.old_file, new_file=self.new_file,
+			output_file=self.path('changed.json'), removed_file=self.path('removed.json') if removed else None, ignore=ignore))
+
+	def test_diff(self):
+		self.diff()
+		self.assertEqual(self.read('changed.json'), ['d4', 'e5', 'b2'])
+		self.assertEqual(self.read('removed.json'), ['c3'])
+
+	def test_ignore(self):
+		self.diff(ignore=['uploaded_at'])
+		self.assertEqual(self.read('changed.json'), ['e5', 'b2'])
+
+	def test_counts(self):
+		with exports.JSONArrayWriter(None) as changed:
+			counts = exports.diff_records(self.old_file, self.new_file, 'entries', changed, None)
+		self.assertEqual(counts, (1, 2, 1))
+		self.assertEqual(changed.count, 3)
+
+	def test_unchanged(self):
+		self.new_file = self.old_file
+		self.diff()
+		self.assertEqual(self.read('changed.json'), [])
+		self.assertEqual(self.read('removed.json'), [])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+#--------------------
+# System wide imports
+# -------------------
+
+import tempfile
+import unittest
+import unittest.mock
+
+import requests
+
+#--------------
+# local imports
+# -------------
+
+from tools_actionproject import httpcache
+
+# ----------------
+# Module constants
+# ----------------
+
+URL = 'https://five.epicollect.net/api/export/entries/street-spectra'
+
+TTL = 3600
+
+# ----------
+# Test cases
+# ----------
+
+def response(body, status=200):
+	result = requests.Response()
+	result.status_code = status
+	result.headers.update({'Content-Type': 'application/json', 'Content-Length': str(len(body))})
+	result._content = body
+	return result
+
+
+class HTTPCacheTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmpdir = tempfile.TemporaryDirectory()
+		self.now = 1000.0
+		patcher = unittest.mock.patch.object(httpcache.time, 'time', lambda: self.now)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		self.cache = self.open()
+
+	def tearDown(self):
+		self.cache.close()
+		self.tmpdir.cleanup()
+
+	def open(self):
+		return httpcache.HTTPCache(self.tmpdir.name, ttl=TTL)
+
+	def page(self, number):
+		return httpcache.cache_key(URL, {'page': number, 'per_page': 50})
+
+	def test_get(self):
+		self.assertIsNone(self.cache.get(self.page(1)))
+		self.cache.put(self.page(1), response(b'{"data": [1]}'))
+		cached = self.cache.get(self.page(1))
+		self.assertEqual(cached.json(), {"data": [1]})
+		self.assertEqual(cached.headers['content-type'], 'application/json')
+		self.assertNotIn('content-length', cached.headers)
+		self.assertIsNone(self.cache.get(self.page(2)))
+		self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+	def test_errors_not_cached(self):
+		self.cache.put(self.page(1), response(b'{}', status=500))
+		self.assertIsNone(self.cache.get(self.page(1)))
+		self.assertEqual(self.cache.size, 0)
+
+	def test_expired(self):
+		self.cache.put(self.page(1), response(b'[1]'))
+		self.now += TTL + 1
+		self.assertIsNone(self.cache.get(self.page(1)))
+
+	def test_size(self):
+		self.cache.put(self.page(1), response(b'x' * 100))
+		self.cache.put(self.page(2), response(b'x' * 50))
+		self.cache.put(self.page(1), response(b'x' * 10))
+		self.assertEqual(self.cache.size, 60)
+		self.cache.close()
+		self.cache = self.open()
+		self.assertEqual(self.cache.size, 60)
+		self.now += TTL + 1
+		self.cache.put(self.page(3), response(b'x' * 5))
+		self.assertEqual(self.cache.size, 5)
+
+	def test_lru_eviction(self):
+		self.cache.max_size = 250
+		for number in range(1, 4):
+			self.cache.put(self.page(number), response(b'x' * 100))
+			self.now += 1
+		self.assertIsNone(self.cache.get(self.page(1)))
+		self.assertEqual(self.cache.size, 200)
+		# Reading page 2 leaves page 3 as the least recently used one
+		self.assertIsNotNone(self.cache.get(self.page(2)))
+		self.now += 1
+		self.cache.put(self.page(4), response(b'x' * 100))
+		self.assertIsNone(self.cache.get(self.page(3)))
+		self.assertIsNotNone(self.cache.get(self.page(2)))
+		self.assertIsNotNone(self.cache.get(self.page(4)))
+		self.assertEqual(self.cache.size, 200)
+
+
+class CachedSessionTestCase(unittest.TestCase):
+
+	def test_lookup(self):
+		with tempfile.TemporaryDirectory() as tmpdir:
+			session = httpcache.CachedSession(httpcache.HTTPCache(tmpdir))
+			params = {'page': 2}
+			session.cache.put(httpcache.cache_key(URL, params), response(b'[2]'))
+			self.assertEqual(session.lookup('GET', URL, params).json(), [2])
+			self.assertIsNone(session.lookup('POST', URL, params))
+			self.assertIsNone(session.lookup('GET', URL, {'page': 3}))
+			session.close()
+
+
+if __name__ == '__main__':
+	unittest.main()
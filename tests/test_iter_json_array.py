@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+#--------------------
+# System wide imports
+# -------------------
+
+import io
+import json
+import unittest
+
+#--------------
+# local imports
+# -------------
+
+from tools_actionproject.jsonstream import iter_json_array
+
+# ----------------
+# Module constants
+# ----------------
+
+CHUNK_SIZES = list(range(1, 40)) + [64, 1000]
+
+OBJECTS = [
+	{"id": "a1", "location": {"latitude": 40.42, "longitude": -3.7}, "comment": "Sodium [lamp], \"orange\""},
+	{"id": "b2", "location": {"latitude": -33.9, "longitude": 18.4}, "comment": None, "ok": True},
+	{"id": "c3", "values": [1, -2.5, 3e-4, []], "nested": {"empty": {}}},
+]
+
+NUMBERS = [0, 1, -1, 1.5, 1.5e10, -2.25E-3, 123456789, 1e+300, 0.000001]
+
+# ----------
+# Test cases
+# ----------
+
+class IterJSONArrayTestCase(unittest.TestCase):
+
+	def check(self, data, expected, key=None):
+		for text in (json.dumps(data), json.dumps(data, indent=2)):
+			for chunk_size in CHUNK_SIZES:
+				with self.subTest(chunk_size=chunk_size, indent='\n' in text):
+					self.assertEqual(list(iter_json_array(io.StringIO(text), key, chunk_size)), expected)
+
+	def test_objects(self):
+		self.check(OBJECTS, OBJECTS)
+
+	def test_numbers(self):
+		self.check(NUMBERS, NUMBERS)
+
+	def test_mixed(self):
+		self.check(["x", 2, True, None, [3.5], {"y": 4e2}], ["x", 2, True, None, [3.5], {"y": 4e2}])
+
+	def test_empty(self):
+		self.check([], [])
+
+	def test_key(self):
+		self.check({"meta": {"total": 3}, "data": NUMBERS, "links": None}, NUMBERS, key="data")
+
+	def test_missing_key(self):
+		with self.assertRaises(KeyError):
+			list(iter_json_array(io.StringIO('{"meta": 1}'), "data", 4))
+
+	def test_truncated(self):
+		with self.assertRaises(ValueError):
+			list(iter_json_array(io.StringIO('[1.5e10, 2'), None, 3))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+#--------------------
+# System wide imports
+# -------------------
+
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+#--------------
+# local imports
+# -------------
+
+from tools_actionproject import ratelimit
+
+# ----------
+# Test cases
+# ----------
+
+class Clock:
+	'''Fake clock for both time.monotonic() and time.time()'''
+
+	def __init__(self):
+		self.now = 1000.0
+
+	def __call__(self):
+		return self.now
+
+
+class TokenBucketTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.clock = Clock()
+		for name in ('monotonic', 'time'):
+			patcher = unittest.mock.patch.object(ratelimit.time, name, self.clock)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+	def check(self, bucket):
+		# The burst is free, then slots are booked ahead at the bucket rate
+		self.assertEqual([bucket.reserve() for _ in range(5)], [0.0, 0.0, 0.5, 1.0, 1.5])
+		# Tokens refill with time, up to the burst size
+		self.clock.now += 10.0
+		self.assertEqual([bucket.reserve() for _ in range(3)], [0.0, 0.0, 0.5])
+
+	def test_bucket(self):
+		self.check(ratelimit.TokenBucket(2.0, 2))
+
+	def test_unlimited(self):
+		bucket = ratelimit.TokenBucket(None)
+		self.assertEqual([bucket.reserve() for _ in range(100)], [0.0] * 100)
+
+	def test_file_bucket(self):
+		with tempfile.TemporaryDirectory() as tmpdir:
+			self.check(ratelimit.FileTokenBucket(2.0, 2, os.path.join(tmpdir, 'host.bucket')))
+
+	def test_shared_file_bucket(self):
+		# Buckets of different processes book slots from the same budget
+		with tempfile.TemporaryDirectory() as tmpdir:
+			path = os.path.join(tmpdir, 'host.bucket')
+			first, second = ratelimit.FileTokenBucket(1.0, 1, path), ratelimit.FileTokenBucket(1.0, 1, path)
+			self.assertEqual([first.reserve(), second.reserve(), first.reserve()], [0.0, 1.0, 2.0])
+
+
+class PoliciesTestCase(unittest.TestCase):
+
+	def test_environment(self):
+		env = {ratelimit.LIMITS_ENV: "example.org=5, api.actionproject.eu=0.5:3"}
+		with unittest.mock.patch.dict(os.environ, env):
+			policies = ratelimit.policies()
+		self.assertEqual(policies['example.org'], (5.0, 1))
+		self.assertEqual(policies['api.actionproject.eu'], (0.5, 3))
+		self.assertEqual(policies['five.epicollect.net'], ratelimit.POLICIES['five.epicollect.net'])
+
+	def test_state_dir(self):
+		with tempfile.TemporaryDirectory() as tmpdir, unittest.mock.patch.dict(os.environ, {ratelimit.DIR_ENV: tmpdir}):
+			bucket = ratelimit.make_bucket('example.org', 1.0, 1)
+			self.assertIsInstance(bucket, ratelimit.FileTokenBucket)
+			self.assertEqual(os.path.dirname(bucket.path), tmpdir)
+
+
+if __name__ == '__main__':
+	unittest.main()
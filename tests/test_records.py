@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+#--------------------
+# System wide imports
+# -------------------
+
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+#--------------
+# local imports
+# -------------
+
+from tools_actionproject import records
+
+# ----------------
+# Module constants
+# ----------------
+
+COUNTS = [0, 1, 2, 3, 4, 5, 7, 8, 9, 1000, 4097]
+
+# ----------
+# Test cases
+# ----------
+
+class RecordFileTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmpdir = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.tmpdir.name, 'entries.rec')
+
+	def tearDown(self):
+		self.tmpdir.cleanup()
+
+	def write(self, count, key='id'):
+		items = [{key: "uuid-{0}".format(i), "value": i} for i in range(count)]
+		self.assertEqual(records.write_records(self.path, items, key), count)
+		return items
+
+	def check(self, items, key='id'):
+		with records.RecordFile(self.path) as record_file:
+			self.assertEqual(len(record_file), len(items))
+			self.assertEqual(list(record_file), items)
+			for item in items:
+				self.assertEqual(record_file.get(item[key]), item)
+			self.assertIsNone(record_file.get("missing"))
+			self.assertNotIn("missing", record_file)
+
+	def test_table_size(self):
+		for count in COUNTS:
+			with self.subTest(count=count):
+				size = records.table_size(count)
+				self.assertEqual(size & (size - 1), 0)
+				self.assertGreaterEqual(size, 2 * count)
+				self.assertLess(size, max(2, 4 * count))
+
+	def test_grow(self):
+		for count in COUNTS:
+			with self.subTest(count=count):
+				self.check(self.write(count))
+
+	def test_positions(self):
+		items = self.write(10)
+		with records.RecordFile(self.path) as record_file:
+			self.assertEqual(record_file[0], items[0])
+			self.assertEqual(record_file[-1], items[-1])
+			self.assertEqual(record_file[2:8:3], items[2:8:3])
+			with self.assertRaises(IndexError):
+				record_file[10]
+
+	def test_same_hash(self):
+		# Every id lands in the same slot, so lookups probe past the other records
+		with unittest.mock.patch.object(records, 'id_hash', lambda record_id: 5):
+			self.check(self.write(50))
+
+	def test_wrap_around(self):
+		# Ids hashing to the last slot wrap around to the start of the table
+		size = records.table_size(20)
+		with unittest.mock.patch.object(records, 'id_hash', lambda record_id: size - 1 + size * (len(record_id) % 2)):
+			self.check(self.write(20))
+
+	def test_key(self):
+		self.check(self.write(30, key='ec5_uuid'), key='ec5_uuid')
+
+	def test_not_record_file(self):
+		with open(self.path, 'wb') as fd:
+			fd.write(b'\0' * records.HEADER.size)
+		with self.assertRaises(ValueError):
+			records.RecordFile(self.path)
+
+	def test_failed_write(self):
+		with self.assertRaises(KeyError):
+			records.write_records(self.path, [{"id": "a"}, {"other": "b"}])
+		self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == '__main__':
+	unittest.main()
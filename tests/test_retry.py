@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+#--------------------
+# System wide imports
+# -------------------
+
+import datetime
+import unittest
+import unittest.mock
+import email.utils
+
+import requests
+
+#--------------
+# local imports
+# -------------
+
+from tools_actionproject import retry
+
+# ----------
+# Test cases
+# ----------
+
+class Limiter:
+	'''Rate limiter counting the acquired slots'''
+
+	def __init__(self):
+		self.acquired = 0
+
+	def acquire(self):
+		self.acquired += 1
+
+
+class Session:
+	'''requests session answering with a fixed sequence of (status, headers) responses'''
+
+	def __init__(self, *responses):
+		self.responses = list(responses)
+		self.requests  = 0
+
+	def request(self, method, url, **kwargs):
+		self.requests += 1
+		status, headers = self.responses.pop(0)
+		response = requests.Response()
+		response.status_code = status
+		response.headers.update(headers)
+		response.url = url
+		return response
+
+
+def http_date(seconds):
+	return email.utils.format_datetime(datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=seconds), usegmt=True)
+
+
+class RetryAfterTestCase(unittest.TestCase):
+
+	def test_seconds(self):
+		self.assertEqual(retry.retry_after({'Retry-After': '7'}, 1.0), 7.0)
+		self.assertEqual(retry.retry_after({'Retry-After': ' 0 '}, 1.0), 0.0)
+
+	def test_date(self):
+		self.assertAlmostEqual(retry.retry_after({'Retry-After': http_date(30)}, 1.0), 30.0, delta=2.0)
+
+	def test_past_date(self):
+		self.assertEqual(retry.retry_after({'Retry-After': http_date(-30)}, 1.0), 0.0)
+
+	def test_capped(self):
+		self.assertEqual(retry.retry_after({'Retry-After': '86400'}, 1.0), retry.MAX_DELAY)
+		self.assertEqual(retry.retry_after({'Retry-After': http_date(86400)}, 1.0), retry.MAX_DELAY)
+
+	def test_default(self):
+		for headers in ({}, {'Retry-After': ''}, {'Retry-After': 'soon'}, {'Retry-After': '-5'}, {'Retry-After': '1.5'}):
+			with self.subTest(headers=headers):
+				self.assertEqual(retry.retry_after(headers, 1.0), 1.0)
+
+
+class RequestTestCase(unittest.TestCase):
+
+	def setUp(self):
+		patcher = unittest.mock.patch.object(retry.time, 'sleep')
+		self.sleep = patcher.start()
+		self.addCleanup(patcher.stop)
+		self.limiter = Limiter()
+
+	def request(self, method, session, retries=retry.DEFAULT_RETRIES):
+		return retry.request(session, method, 'https://api.example.org/items', limiter=self.limiter, retries=retries)
+
+	def test_retry_after(self):
+		session = Session((429, {'Retry-After': '12'}), (503, {'Retry-After': http_date(20)}), (200, {}))
+		self.assertEqual(self.request('GET', session).status_code, 200)
+		self.assertEqual(session.requests, 3)
+		self.assertEqual(self.limiter.acquired, 3)
+		delays = [call.args[0] for call in self.sleep.call_args_list]
+		self.assertEqual(delays[0], 12.0)
+		self.assertAlmostEqual(delays[1], 20.0, delta=2.0)
+
+	def test_backoff_without_header(self):
+		session = Session((502, {}), (200, {}))
+		self.request('GET', session)
+		delay = self.sleep.call_args.args[0]
+		self.assertTrue(0.5 * retry.DEFAULT_BACKOFF <= delay <= 1.5 * retry.DEFAULT_BACKOFF)
+
+	def test_give_up(self):
+		session = Session(*[(503, {'Retry-After': '1'})] * 3)
+		with self.assertRaises(requests.HTTPError):
+			self.request('GET', session, retries=2)
+		self.assertEqual(session.requests, 3)
+
+	def test_post_throttled(self):
+		session = Session((429, {'Retry-After': '3'}), (201, {}))
+		self.assertEqual(self.request('POST', session).status_code, 201)
+		self.assertEqual(session.requests, 2)
+
+	def test_post_server_error(self):
+		# The server may have stored the record before failing
+		session = Session((500, {}), (201, {}))
+		with self.assertRaises(requests.HTTPError):
+			self.request('POST', session)
+		self.assertEqual(session.requests, 1)
+		self.sleep.assert_not_called()
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+# Copyright (c) 2021
+#
+# See the LICENSE file for details
+# see the AUTHORS file for authors
+# ----------------------------------------------------------------------
+
+#--------------------
+# System wide imports
+# -------------------
+
+import os
+import json
+import tempfile
+import unittest
+import argparse
+
+#--------------
+# local imports
+# -------------
+
+from actiontool import store
+
+# ----------------
+# Module constants
+# ----------------
+
+OBSERVATIONS = [
+	{"id": "a1", "created_at": "2021-03-01 20:00:00", "location": {"latitude": 40.42, "longitude": -3.7}},
+	{"id": "b2", "created_at": "2021-03-02 21:00:00", "location": {"latitude": -33.9, "longitude": 18.4}},
+	{"id": "c3", "created_at": "2021-03-03 22:00:00"},
+]
+
+# ----------
+# Test cases
+# ----------
+
+class IngestTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.tmpdir = tempfile.TemporaryDirectory()
+		self.database = os.path.join(self.tmpdir.name, 'store.db')
+		self.conn = store.open_store(self.database)
+
+	def tearDown(self):
+		self.conn.close()
+		self.tmpdir.cleanup()
+
+	def ingest_file(self, records, kind='observations'):
+		path = os.path.join(self.tmpdir.name, 'input.json')
+		with open(path, 'w') as fd:
+			json.dump(records, fd)
+		store.ingest(argparse.Namespace(kind=kind, input_file=path, database=self.database, project=None))
+
+	def test_empty_records(self):
+		for kind in store.KINDS:
+			with self.subTest(kind=kind):
+				self.assertEqual(store.ingest_records(self.conn, kind, []), 0)
+
+	def test_new_and_replaced(self):
+		self.assertEqual(store.ingest_records(self.conn, 'observations', OBSERVATIONS), 3)
+		self.assertEqual(store.ingest_records(self.conn, 'observations', OBSERVATIONS[:2]), 0)
+		self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM observation_location_t").fetchone()[0], 2)
+
+	def test_ingest_file(self):
+		self.ingest_file([])
+		self.ingest_file(OBSERVATIONS)
+		records = list(store.select_records(self.conn, 'observations'))
+		self.assertEqual([record['id'] for record in records], ['a1', 'b2', 'c3'])
+
+
+class RadiusTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.conn = store.open_store(':memory:')
+
+	def tearDown(self):
+		self.conn.close()
+
+	def select(self, radius, *points):
+		records = [{"id": str(i), "created_at": "2021-03-01", "location": {"latitude": lat, "longitude": lon}}
+			for i, (lat, lon) in enumerate(points)]
+		store.ingest_records(self.conn, 'observations', records)
+		return [record['id'] for record in store.select_records(self.conn, 'observations', radius=radius)]
+
+	def test_tangent_meridian(self):
+		# 991.6 Km away, east of the longitude of a 1000 Km radius at constant latitude
+		self.assertLess(store.distance(60.0, 0.0, 60.5, 18.0), 1000.0)
+		self.assertEqual(self.select((60.0, 0.0, 1000.0), (60.5, 18.0), (60.0, 18.3)), ['0'])
+
+	def test_across_pole(self):
+		# 66.7 Km away on the opposite meridian
+		self.assertLess(store.distance(89.7, 0.0, 89.7, 180.0), 100.0)
+		self.assertEqual(self.select((89.7, 0.0, 100.0), (89.7, 180.0), (88.0, 0.0)), ['0'])
+
+	def test_bbox(self):
+		self.assertEqual(store.radius_bbox(89.7, 0.0, 100.0)[::2], (-180.0, 180.0))
+		self.assertEqual(store.radius_bbox(0.0, 10.0, 20100.0)[::2], (-180.0, 180.0))
+		min_lon, min_lat, max_lon, max_lat = store.radius_bbox(0.0, 179.5, 111.0)
+		self.assertGreater(max_lon, 180.0)
+		self.assertAlmostEqual(max_lat, -min_lat)
+
+
+if __name__ == '__main__':
+	unittest.main()